@@ -1,10 +1,12 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from shop.storage import blob_storage
+
 
 class User(AbstractUser):
     bio = models.TextField(blank=True)
-    avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    avatar = models.ImageField(upload_to='avatars/', storage=blob_storage, blank=True, null=True)
 
     def __str__(self):
         return self.username
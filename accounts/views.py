@@ -3,6 +3,7 @@ from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.views import LoginView
+from shop.jobs import enqueue
 from .forms import SignUpForm, ProfileForm
 
 
@@ -56,9 +57,13 @@ def signup_view(request):
 @login_required
 def profile_view(request):
     if request.method == 'POST':
+        # Read before validation, which writes the new values onto the user
+        old_avatar = request.user.avatar.name
         form = ProfileForm(request.POST, request.FILES, instance=request.user)
         if form.is_valid():
             form.save()
+            if old_avatar and 'avatar' in form.changed_data:
+                enqueue('files.delete', names=[old_avatar])
             messages.success(request, 'Profile updated successfully.')
             return redirect('profile')
     else:
@@ -0,0 +1 @@
+"""Database backend: django.db.backends.postgresql with a per-worker connection pool."""
@@ -0,0 +1,95 @@
+"""PostgreSQL through a per-worker connection pool.
+
+Django's postgresql backend, except that opening a connection checks one
+out of the process's pool (see pool.py) and closing it hands it back.
+With CONN_MAX_AGE = 0 Django "closes" the connection after every
+request, so each request borrows a live connection instead of opening
+one. The ``POOL`` entry of the database settings configures the pool.
+"""
+import os
+
+from django.db.backends.postgresql import base, creation
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from .pool import ConnectionPool, abandon, close_pools, get_pool
+
+# TRANSACTION_STATUS_IDLE in psycopg2, TransactionStatus.IDLE in psycopg 3
+TRANSACTION_IDLE = 0
+
+
+def _ping(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    if not connection.autocommit:
+        connection.rollback()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Pooled connections to the test database would block DROP DATABASE
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def _pool(self, conn_params):
+        key = '{alias}:{user}@{host}:{port}/{dbname}'.format(
+            alias=self.alias, user=conn_params.get('user', ''), host=conn_params.get('host', ''),
+            port=conn_params.get('port', ''), dbname=conn_params.get('database', conn_params.get('dbname', '')),
+        )
+        return get_pool(key, lambda: ConnectionPool(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params), _ping,
+            **self.settings_dict.get('POOL', {}),
+        ))
+
+    def get_new_connection(self, conn_params):
+        # What the parent sets on a fresh connection; pooled ones keep theirs
+        try:
+            self.isolation_level = IsolationLevel(self.settings_dict['OPTIONS']['isolation_level'])
+        except KeyError:
+            self.isolation_level = IsolationLevel.READ_COMMITTED
+        self._checked_out_from = self._pool(conn_params)
+        self._checked_out_pid = os.getpid()
+        return self._checked_out_from.getconn()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool = getattr(self, '_checked_out_from', None)
+        if pool is None or self._checked_out_pid != os.getpid():
+            abandon(self.connection)
+            return
+        # Closed inside atomic(), Django keeps the connection to roll back
+        # later: it cannot go back to the pool
+        reusable = not self.in_atomic_block and self._reset_connection()
+        with self.wrap_database_errors:
+            pool.putconn(self.connection, reusable=reusable)
+
+    def _reset_connection(self):
+        """Leave the connection idle, outside any transaction; False if that fails."""
+        connection = self.connection
+        if connection.closed:
+            return False
+        try:
+            if connection.info.transaction_status != TRANSACTION_IDLE:
+                connection.rollback()
+            return connection.info.transaction_status == TRANSACTION_IDLE
+        except base.Database.Error:
+            return False
+
+
+def _forget_inherited_connections():
+    # A forked child keeps the parent's connection objects; their sockets
+    # are the parent's to use and close
+    from django.db import connections
+
+    for conn in connections.all(initialized_only=True):
+        if isinstance(conn, DatabaseWrapper) and conn.connection is not None:
+            abandon(conn.connection)
+            conn.connection = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_inherited_connections)
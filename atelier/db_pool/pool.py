@@ -0,0 +1,219 @@
+"""A small, thread-safe pool of database connections, one per process.
+
+Connections are handed out last-in first-out, so a quiet worker keeps
+reusing its warmest connection and the rest age out. On checkout a
+connection is dropped if it has closed, outlived ``max_lifetime`` or sat
+idle past ``max_idle``, and pinged with ``SELECT 1`` once it has been
+idle longer than ``check_idle``. When ``max_size`` connections are in
+use, checkout waits up to ``timeout`` seconds for one to come back.
+
+A forked child never touches the pools it inherits: their sockets still
+belong to the parent, and closing them would end the parent's sessions.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Inherited across a fork: kept referenced so they are never closed (or
+# garbage-collected, which closes them) in this process
+_abandoned = []
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+@dataclass
+class _Entry:
+    connection: object
+    created: float
+    returned: float
+
+
+class ConnectionPool:
+    def __init__(self, connect, ping, max_size=4, timeout=10.0, check_idle=10.0,
+                 max_idle=300.0, max_lifetime=3600.0):
+        self._connect = connect
+        self._ping = ping
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self._idle = deque()
+        self._in_use = {}   # id(connection) -> _Entry
+        self._opening = 0   # slots taken by connections being opened
+        self.closed = False
+        self._cond = threading.Condition()
+        self.counters = dict.fromkeys((
+            'checkouts', 'connects', 'waits', 'timeouts', 'health_check_failures', 'discarded',
+        ), 0)
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _size(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size() < self.max_size:
+                    entry = None
+                    self._opening += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters['timeouts'] += 1
+                    logger.warning('No database connection free after %.1fs (pool of %d)', self.timeout, self.max_size)
+                    raise PoolTimeout(f'No database connection free after {self.timeout}s')
+                waited = True
+                self._cond.wait(remaining)
+            if waited:
+                wait = time.monotonic() - started
+                self.counters['waits'] += 1
+                self.wait_seconds_total += wait
+                self.wait_seconds_max = max(self.wait_seconds_max, wait)
+            if entry is not None:
+                self._in_use[id(entry.connection)] = entry
+
+        if entry is not None:
+            if self._healthy(entry):
+                with self._cond:
+                    self.counters['checkouts'] += 1
+                return entry.connection
+            with self._cond:
+                del self._in_use[id(entry.connection)]
+                self._opening += 1
+            self._close(entry.connection)
+        return self._open()
+
+    def _healthy(self, entry):
+        now = time.monotonic()
+        connection = entry.connection
+        if connection.closed or now - entry.created > self.max_lifetime or now - entry.returned > self.max_idle:
+            return False
+        if now - entry.returned > self.check_idle:
+            try:
+                self._ping(connection)
+            except Exception:
+                with self._cond:
+                    self.counters['health_check_failures'] += 1
+                logger.warning('Dropped a pooled database connection that failed its health check', exc_info=True)
+                return False
+        return True
+
+    def _open(self):
+        """Open a connection into a slot already reserved in _opening."""
+        try:
+            connection = self._connect()
+        except BaseException:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            raise
+        now = time.monotonic()
+        with self._cond:
+            self._opening -= 1
+            self._in_use[id(connection)] = _Entry(connection, now, now)
+            self.counters['connects'] += 1
+            self.counters['checkouts'] += 1
+        return connection
+
+    def putconn(self, connection, reusable=True):
+        """Hand ``connection`` back; it is closed instead unless ``reusable``."""
+        with self._cond:
+            entry = self._in_use.pop(id(connection), None)
+        if entry is None or self.closed:
+            reusable = False
+        elif reusable:
+            reusable = not connection.closed and time.monotonic() - entry.created < self.max_lifetime
+        if not reusable:
+            self._close(connection)
+        with self._cond:
+            if reusable:
+                entry.returned = time.monotonic()
+                self._idle.append(entry)
+            self._cond.notify()
+
+    def _close(self, connection):
+        with self._cond:
+            self.counters['discarded'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Close the idle connections; those in use close when returned."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self.closed = True
+        for entry in idle:
+            self._close(entry.connection)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                **self.counters,
+                'wait_seconds_total': round(self.wait_seconds_total, 6),
+                'wait_seconds_max': round(self.wait_seconds_max, 6),
+            }
+
+
+def get_pool(key, factory):
+    """The pool for ``key`` in this process, made by ``factory()`` on first use."""
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = factory()
+    return pool
+
+
+def close_pools():
+    """Close every pool of this process; the next checkout starts a new one."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """{pool key: stats} for this process."""
+    return {key: pool.stats() for key, pool in list(_pools.items())}
+
+
+def abandon(connection):
+    """Forget a connection inherited from the parent process without closing it."""
+    _abandoned.append(connection)
+
+
+def _after_fork_in_child():
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    for pool in _pools.values():
+        _abandoned.extend(entry.connection for entry in pool._idle)
+        _abandoned.extend(entry.connection for entry in pool._in_use.values())
+    _pools.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
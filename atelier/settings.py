@@ -23,15 +23,18 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    # shop overrides collectstatic, so it must come before staticfiles
+    'shop',
     'django.contrib.staticfiles',
     'axes',
     'accounts',
-    'shop',
     'blog',
 ]
 
 MIDDLEWARE = [
+    'shop.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'shop.querybudget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -62,15 +65,39 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'atelier.wsgi.application'
 
+# Threads per process running the concurrent queries of the async views
+# (shop.parallel); each holds a database connection while its query runs
+QUERY_THREADS = int(os.environ.get('QUERY_THREADS', 4))
+
 if os.environ.get('DATABASE_ENGINE') == 'postgresql':
+    # Each worker process keeps a pool of connections (atelier.db_pool) and
+    # every request borrows one, so CONN_MAX_AGE stays 0: Django hands the
+    # connection back when the request ends. DB_POOL=False falls back to
+    # Django's own persistent connections, one per thread. The pool covers
+    # the query threads plus the threads serving requests.
+    DB_POOL = os.environ.get('DB_POOL', 'True').lower() == 'true'
+    DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 0))  # ms, 0 for none
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': 'atelier.db_pool' if DB_POOL else 'django.db.backends.postgresql',
             'NAME': os.environ.get('DB_NAME', 'atelier'),
             'USER': os.environ.get('DB_USER', 'atelier'),
             'PASSWORD': os.environ.get('DB_PASSWORD', ''),
             'HOST': os.environ.get('DB_HOST', 'db'),
             'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+                **({'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT}'} if DB_STATEMENT_TIMEOUT else {}),
+            },
+            'POOL': {
+                'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', QUERY_THREADS + 4)),
+                'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),         # wait for a free connection
+                'check_idle': float(os.environ.get('DB_POOL_CHECK_IDLE', 10)),   # ping after this long idle
+                'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+                'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+            },
         }
     }
 else:
@@ -94,12 +121,45 @@ USE_I18N = True
 USE_TZ = True
 
 STATIC_URL = '/static/'
-STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_GENERATED_DIR = BASE_DIR / 'static_generated'
+STATICFILES_DIRS = [BASE_DIR / 'static', STATIC_GENERATED_DIR]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Public address of the site, for absolute URLs in sitemaps and feeds
+SITE_URL = os.environ.get('SITE_URL', 'http://searabbit.co.kr')
+
+# Tailwind standalone CLI used by build_css (e.g. "npx tailwindcss@3" in development)
+TAILWIND_CLI = os.environ.get('TAILWIND_CLI', 'tailwindcss')
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploaded images: headers over IMAGE_MAX_PIXELS are refused outright,
+# nothing is decoded to more than IMAGE_DECODE_PIXELS (~3 bytes each), and
+# stored images are at most IMAGE_MAX_SIDE on their long side
+IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 100_000_000))
+IMAGE_DECODE_PIXELS = int(os.environ.get('IMAGE_DECODE_PIXELS', 24_000_000))
+IMAGE_MAX_SIDE = int(os.environ.get('IMAGE_MAX_SIDE', 3200))
+
+# Runtime state shared by all workers (cache version stamps, etc.)
+STATE_DIR = Path(os.environ.get('ATELIER_STATE_DIR', BASE_DIR / 'var'))
+
+# Query budgets: X-Query-Count headers outside production; strict mode
+# turns an over-budget view into an error (enable it for test runs)
+QUERY_BUDGET_HEADERS = DEBUG
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', 'False').lower() == 'true'
+
+# Request metrics (shop.metrics): each worker writes its totals to
+# STATE_DIR/metrics this often; /shop/manage/metrics/ serves the sum to
+# staff, or to a Prometheus scraper sending "Authorization: Bearer <token>"
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Background jobs: run in `manage.py run_jobs`, or inline after commit when eager
+JOBS_EAGER = os.environ.get('JOBS_EAGER', 'False').lower() == 'true'
+# Finished jobs are deleted after this many days; failed ones are kept
+JOBS_KEEP_DAYS = int(os.environ.get('JOBS_KEEP_DAYS', '7'))
+
 AUTH_USER_MODEL = 'accounts.User'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
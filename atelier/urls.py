@@ -3,7 +3,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
-from shop.views import home_view, page_detail_view
+from shop.views import home_view, page_detail_view, search_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -11,6 +11,7 @@ urlpatterns = [
     path('shop/', include('shop.urls')),
     path('blog/', include('blog.urls')),
     path('accounts/', include('accounts.urls')),
+    path('search/', search_view, name='search'),
     path('<slug:slug>/', page_detail_view, name='page_detail'),  # catch-all, must be last
 ]
 
@@ -4,7 +4,8 @@ from .models import Post, Comment
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ('title', 'author', 'related_product', 'created_at')
+    list_display = ('title', 'author', 'related_product', 'comment_count', 'created_at')
+    list_select_related = ('author', 'related_product')
     prepopulated_fields = {'slug': ('title',)}
     search_fields = ('title', 'content')
 
@@ -12,4 +13,5 @@ class PostAdmin(admin.ModelAdmin):
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('author', 'post', 'created_at')
+    list_select_related = ('author', 'post')
     list_filter = ('created_at',)
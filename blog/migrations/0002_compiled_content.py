@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:15
+
+from django.db import migrations, models
+
+from shop.content import content_image_map, render_rich_content, source_hash
+
+
+def compile_existing(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    ContentImage = apps.get_model('shop', 'ContentImage')
+    for post in Post.objects.all():
+        image_map = {}
+        if post.related_product_id:
+            image_map = content_image_map(ContentImage.objects.filter(product_id=post.related_product_id))
+        Post.objects.filter(pk=post.pk).update(
+            content_html=render_rich_content(post.content, image_map),
+            content_hash=source_hash(post.content, image_map),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0001_initial'),
+        ('shop', '0011_compiled_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(compile_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_compiled_content'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['created_at', 'id'], name='blog_post_created_c33a01_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:46
+
+from django.db import migrations, models
+import shop.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=shop.storage.blob_storage, upload_to='posts/'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:50
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Comment = apps.get_model('blog', 'Comment')
+    counts = Comment.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(n=Count('pk'))
+    Post.objects.update(comment_count=Coalesce(Subquery(counts.values('n')[:1]), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_post_image_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created_at', 'id'], name='blog_commen_post_id_462e89_idx'),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
@@ -1,25 +1,48 @@
 from django.db import models
 from django.conf import settings
 
+from shop.content import render_rich_content, source_hash
+from shop.storage import blob_storage
+
 
 class Post(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     content = models.TextField()
+    content_html = models.TextField(blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     related_product = models.ForeignKey(
         'shop.Product', on_delete=models.SET_NULL, null=True, blank=True
     )
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    image = models.ImageField(upload_to='posts/', storage=blob_storage, blank=True, null=True)
+    # Kept by signals with F() updates (see shop.signals.count_comments)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['created_at', 'id'])]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.compile_content()
+        super().save(*args, **kwargs)
+
+    def compile_content(self, image_map=None):
+        """Refresh content_html, rendered with the related product's content images."""
+        if image_map is None:
+            image_map = self.related_product.content_image_map() if self.related_product_id else {}
+        digest = source_hash(self.content, image_map)
+        if digest == self.content_hash:
+            return False
+        self.content_html = render_rich_content(self.content, image_map)
+        self.content_hash = digest
+        return True
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
@@ -29,6 +52,7 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [models.Index(fields=['post', 'created_at', 'id'])]
 
     def __str__(self):
         return f'{self.author} on {self.post}'
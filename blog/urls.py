@@ -3,5 +3,6 @@ from . import views
 
 urlpatterns = [
     path('', views.post_list_view, name='post_list'),
+    path('list/more/', views.post_list_more_view, name='post_list_more'),
     path('<slug:slug>/', views.post_detail_view, name='post_detail'),
 ]
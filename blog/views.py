@@ -1,30 +1,95 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from .models import Post
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.shortcuts import render, redirect
+from django.urls import reverse
+
+from shop.conditional import conditional_page, page_validators
+from shop.pagination import cursor_url, keyset_page
+from shop.parallel import gather_queries
+from shop.querybudget import query_budget
+from .models import Comment, Post
 from .forms import CommentForm
 
+COMMENTS_PER_PAGE = 20
+
+
+def _post_cards():
+    return Post.objects.select_related('author').defer('content_html')
+
 
+@query_budget(5)
 def post_list_view(request):
-    posts = Post.objects.all()
-    return render(request, 'blog/post_list.html', {'posts': posts})
-
-
-def post_detail_view(request, slug):
-    post = get_object_or_404(Post, slug=slug)
-    comments = post.comments.all()
-
-    if request.method == 'POST' and request.user.is_authenticated:
-        form = CommentForm(request.POST)
-        if form.is_valid():
-            comment = form.save(commit=False)
-            comment.post = post
-            comment.author = request.user
-            comment.save()
-            return redirect('post_detail', slug=slug)
-    else:
-        form = CommentForm()
-
-    return render(request, 'blog/post_detail.html', {
+    posts, next_cursor = keyset_page(_post_cards(), request.GET.get('cursor'))
+    return render(request, 'blog/post_list.html', {
+        'posts': posts,
+        'next_url': next_cursor and cursor_url(request, reverse('post_list'), next_cursor),
+        'more_url': next_cursor and cursor_url(request, reverse('post_list_more'), next_cursor),
+    })
+
+
+@query_budget(3)
+def post_list_more_view(request):
+    """The next slice of post cards, for the journal's "load more" button."""
+    posts, next_cursor = keyset_page(_post_cards(), request.GET.get('cursor'))
+    response = render(request, 'blog/post_cards.html', {'posts': posts})
+    if next_cursor:
+        response['X-Next-Cursor'] = next_cursor
+    return response
+
+
+def _post_validators(request, slug):
+    # A new or deleted comment moves the post's comment_count and updated_at
+    row = Post.objects.filter(slug=slug).values(
+        'pk', 'updated_at', 'comment_count', 'author__username', 'related_product__updated_at',
+    ).first()
+    if row is None:
+        return None
+    last_modified = max(filter(None, (row['updated_at'], row['related_product__updated_at'])))
+    return page_validators(
+        request, 'post', *row.values(), request.GET.get('cursor'), last_modified=last_modified,
+    )
+
+
+def _comment_form(request, post):
+    """(form, saved) for the comment form; a member's POST is saved if valid."""
+    if request.method != 'POST' or not request.user.is_authenticated:
+        return CommentForm(), False
+    form = CommentForm(request.POST)
+    if not form.is_valid():
+        return form, False
+    comment = form.save(commit=False)
+    comment.post = post
+    comment.author = request.user
+    comment.save()
+    return form, True
+
+
+@query_budget(8)
+@conditional_page(_post_validators)
+async def post_detail_view(request, slug):
+    # Newest first; older comments a keyset page at a time. The page is
+    # found by the post's slug, so it is read alongside the post itself.
+    cursor = request.GET.get('cursor')
+    post, (comments, next_cursor) = await gather_queries(
+        request,
+        lambda: Post.objects.select_related('author', 'related_product').filter(slug=slug).first(),
+        lambda: keyset_page(
+            Comment.objects.filter(post__slug=slug).select_related('author'), cursor, size=COMMENTS_PER_PAGE,
+        ),
+    )
+    if post is None:
+        raise Http404('No Post matches the given query.')
+
+    path = reverse('post_detail', args=[slug])
+    form, saved = await sync_to_async(_comment_form)(request, post)
+    if saved:
+        # Back to the newest comments, where the new one now is
+        return redirect(path + '#comments')
+
+    return await sync_to_async(render)(request, 'blog/post_detail.html', {
         'post': post,
         'comments': comments,
+        'older_comments_url': next_cursor and cursor_url(request, path, next_cursor),
+        'newest_comments_url': cursor and path,
         'form': form,
     })
@@ -4,11 +4,22 @@ set -e
 echo "Creating media directories..."
 mkdir -p /app/media/products/gallery /app/media/products/content /app/media/banners /app/media/popups
 
-echo "Applying database migrations..."
-python manage.py migrate --noinput
+echo "Applying database migrations (if any)..."
+python manage.py migrate_if_needed
 
+if [ "${STARTUP_REPORT:-False}" = "True" ]; then
+    python manage.py startup_report
+fi
+
+# The stylesheet was compiled into the image; only theme.css follows the database
+echo "Collecting static files..."
+python manage.py collectstatic --noinput --skip-css
+
+# Written now only on a fresh volume; otherwise run_jobs refreshes them
+echo "Publishing sitemaps and feeds..."
+python manage.py publish_sitemaps --if-missing
+
+# Mode (WEB_MODE=wsgi|asgi), worker sizing, preload and warm-up are all
+# in gunicorn.conf.py
 echo "Starting Gunicorn..."
-exec gunicorn atelier.wsgi:application \
-    --bind 0.0.0.0:8000 \
-    --workers 3 \
-    --timeout 120
+exec gunicorn --config gunicorn.conf.py
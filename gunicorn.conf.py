@@ -0,0 +1,114 @@
+"""Gunicorn settings for atelier (entrypoint.sh runs ``gunicorn -c gunicorn.conf.py``).
+
+The master imports Django and every app once (preload_app), then
+freezes what it has built so the garbage collector never writes to it:
+forked workers keep sharing those pages instead of each copying them.
+Each worker renders the busiest pages once (shop.warmup) before it
+accepts a connection, so a deploy or restart does not hand the first
+visitors cold caches.
+
+WEB_MODE picks the server: wsgi (threaded sync workers, the default) or
+asgi (uvicorn workers, see atelier/asgi.py). WEB_WORKERS and WEB_THREADS
+override the sizing below; WEB_WORKER_MEMORY_MB is what one worker is
+expected to need at its peak.
+"""
+import gc
+import math
+import os
+
+WEB_MODE = os.environ.get('WEB_MODE', 'wsgi')
+if WEB_MODE not in ('wsgi', 'asgi'):
+    raise RuntimeError(f"WEB_MODE must be wsgi or asgi, not {WEB_MODE!r}")
+
+WORKER_MEMORY_MB = int(os.environ.get('WEB_WORKER_MEMORY_MB', 160))
+MAX_THREADS = 4
+
+
+# ── Host size ──
+
+def _cpu_count():
+    """CPUs this container may use: its affinity, capped by a cgroup v2 CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def _memory_bytes():
+    """Memory this container may use: the cgroup limit, or the host's RAM."""
+    total = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                limit = f.read().strip()
+        except OSError:
+            continue
+        if limit.isdigit():
+            return min(total, int(limit))
+    return total
+
+
+def _size_workers(cpus, memory):
+    """(workers, threads): 2 x CPUs + 1 workers, as many as fit in three quarters of the memory.
+
+    When memory caps the workers, each gets threads for the ones it lost.
+    """
+    wanted = 2 * cpus + 1
+    fit = max(1, int(memory * 0.75) // (WORKER_MEMORY_MB * 1024 * 1024))
+    workers = min(wanted, fit)
+    return workers, min(MAX_THREADS, max(2, math.ceil(wanted / workers)))
+
+
+_workers, _threads = _size_workers(_cpu_count(), _memory_bytes())
+
+
+# ── Server ──
+
+wsgi_app = 'atelier.asgi:application' if WEB_MODE == 'asgi' else 'atelier.wsgi:application'
+bind = os.environ.get('WEB_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_WORKERS') or _workers)
+if WEB_MODE == 'asgi':
+    # One event loop per worker; sync work goes to its threads (QUERY_THREADS)
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    worker_class = 'gthread'
+    threads = int(os.environ.get('WEB_THREADS') or _threads)
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+preload_app = True
+
+
+# ── Hooks ──
+
+def when_ready(server):
+    # Runs in the master after the app is loaded, before the first fork
+    from django.db import connections
+
+    from atelier.db_pool.pool import close_pools
+
+    connections.close_all()
+    # The pooled sockets too: the workers would each inherit a copy
+    close_pools()
+    gc.collect()
+    gc.freeze()
+    server.log.info(
+        'atelier: %s mode, %d worker(s)%s, app preloaded and frozen',
+        WEB_MODE, workers, f' x {threads} threads' if WEB_MODE == 'wsgi' else '',
+    )
+
+
+def post_worker_init(worker):
+    # The worker has its copy of the app but accepts nothing until this returns
+    from shop.warmup import warm_up
+
+    for path, status, ms in warm_up():
+        worker.log.info('Warm-up %s: %s in %.1fms', path, status, ms)
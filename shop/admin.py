@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Product, HeroBanner, Popup
+from .models import Category, Product, HeroBanner, Popup, Job, SearchEntry, MediaBlob
 
 
 @admin.register(Category)
@@ -29,3 +29,24 @@ class PopupAdmin(admin.ModelAdmin):
     list_display = ('title', 'popup_type', 'is_active', 'start_date', 'end_date')
     list_filter = ('is_active', 'popup_type')
     list_editable = ('is_active',)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'attempts', 'run_after', 'created_at', 'updated_at')
+    list_filter = ('status', 'task')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(SearchEntry)
+class SearchEntryAdmin(admin.ModelAdmin):
+    list_display = ('title', 'kind', 'is_public', 'updated_at')
+    list_filter = ('kind', 'is_public')
+    readonly_fields = ('kind', 'object_id', 'title', 'body', 'url', 'is_public', 'updated_at')
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'refcount', 'created_at')
+    search_fields = ('name',)
+    readonly_fields = ('name', 'size', 'refcount', 'created_at')
@@ -0,0 +1,327 @@
+"""Synthetic catalogues and request timing for ``manage.py bench``.
+
+generate_catalogue() bulk-inserts a catalogue of the requested size
+(products, posts, comments, users, image files), filling the compiled
+HTML and search entries that save() and signals would have written.
+run_scenarios() drives the public and manage views through the test
+client and reports latency percentiles, throughput, queries per request
+and peak traced memory for each. With ``asgi`` the requests go through
+the ASGI handler instead of the WSGI one, and ``concurrency`` requests
+are in flight at once: on threads for WSGI, as in a threaded server, on
+one event loop for ASGI, as in a uvicorn worker.
+"""
+import asyncio
+import random
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from asgiref.sync import ThreadSensitiveContext, async_to_sync
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from blog.models import Comment, Post
+
+from .content import render_rich_content, source_hash
+from .models import Category, HeroBanner, MenuItem, Page, Popup, Product, SiteSetting
+from .pagination import keyset_page
+from .related import refresh_related_index
+from .search import rebuild_index
+
+BATCH_SIZE = 2000
+
+WORDS = (
+    'velvet silk lace taffeta muslin brocade damask tulle organza linen cotton satin '
+    'gown bodice skirt bonnet cloak corset petticoat sleeve collar hem ribbon pearl '
+    'embroidered pleated gathered tailored lined hand-sewn regency victorian tudor '
+    'edwardian rococo baroque midnight ivory emerald rose gold crimson sapphire'
+).split()
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _paragraphs(rng, count, words=60):
+    return '\n\n'.join(_text(rng, words) for _ in range(count))
+
+
+def _bulk_create(model, objects):
+    """bulk_create from an iterable in batches, without holding it all in memory."""
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def _image_files(rng, count):
+    """Write ``count`` distinct JPEGs to default storage; returns their names."""
+    from PIL import Image
+
+    names = []
+    for i in range(count):
+        color = tuple(rng.randrange(256) for _ in range(3))
+        buffer = BytesIO()
+        Image.new('RGB', (1600, 1200), color).save(buffer, format='JPEG', quality=85)
+        names.append(default_storage.save(f'products/bench-{i}.jpg', ContentFile(buffer.getvalue())))
+    return names
+
+
+def generate_catalogue(products=1000, posts=500, comments=5000, users=50, images=24,
+                       renditions=False, seed=0, log=print):
+    """Bulk-generate a catalogue. Returns {table: seconds taken}."""
+    rng = random.Random(seed)
+    timings = {}
+
+    def step(name, func):
+        start = time.perf_counter()
+        func()
+        timings[name] = round(time.perf_counter() - start, 3)
+        log(f'  {name}: {timings[name]}s')
+
+    User = get_user_model()
+    image_names = []
+
+    def create_users():
+        password = make_password('bench')
+        User.objects.create(username='bench-admin', password=password, is_staff=True, is_superuser=True)
+        _bulk_create(User, (User(username=f'bench-user-{i}', password=password) for i in range(users)))
+
+    def create_images():
+        image_names.extend(_image_files(rng, images))
+        if renditions:
+            from .renditions import generate_renditions
+            for name in image_names:
+                generate_renditions(Product(image=name).image)
+
+    def create_site():
+        SiteSetting.objects.get_or_create(pk=1)
+        MenuItem.objects.bulk_create([
+            MenuItem(label='Shop', url='/shop/', location='header', display_order=1),
+            MenuItem(label='Journal', url='/blog/', location='header', display_order=2),
+            MenuItem(label='About', url='/about/', location='header', display_order=3),
+        ])
+        Page(title='About', slug='about', content=_paragraphs(rng, 6)).save()
+        HeroBanner.objects.bulk_create([
+            HeroBanner(title=f'Banner {i}', image=image_names[i % len(image_names)] if image_names else '',
+                       display_order=i)
+            for i in range(3)
+        ])
+        Popup.objects.create(title='Welcome', content=_text(rng, 20))
+
+    def create_products():
+        categories = Category.objects.bulk_create([
+            Category(name=f'Category {i}', slug=f'bench-category-{i}') for i in range(12)
+        ])
+
+        def rows():
+            for i in range(products):
+                description = _paragraphs(rng, rng.randint(2, 6))
+                yield Product(
+                    name=f'{_text(rng, 3)[:-1]} {i}', slug=f'bench-product-{i}',
+                    category=categories[i % len(categories)],
+                    price=rng.randint(10, 200), stock=rng.randint(0, 30),
+                    description=description,
+                    description_html=render_rich_content(description, {}),
+                    description_hash=source_hash(description, {}),
+                    image=image_names[i % len(image_names)] if image_names else '',
+                    is_featured=i % 50 == 0,
+                )
+        _bulk_create(Product, rows())
+
+    def create_posts():
+        author_ids = list(User.objects.values_list('pk', flat=True))
+        product_ids = list(Product.objects.values_list('pk', flat=True)[:posts])
+
+        def rows():
+            for i in range(posts):
+                content = _paragraphs(rng, rng.randint(3, 10))
+                yield Post(
+                    title=_text(rng, 5)[:-1], slug=f'bench-post-{i}', content=content,
+                    content_html=render_rich_content(content, {}),
+                    content_hash=source_hash(content, {}),
+                    author_id=rng.choice(author_ids),
+                    related_product_id=product_ids[i] if i % 3 == 0 and i < len(product_ids) else None,
+                )
+        _bulk_create(Post, rows())
+
+    def create_comments():
+        author_ids = list(User.objects.values_list('pk', flat=True))
+        post_ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+        if not post_ids:
+            return
+        # Skewed like real traffic: the first post gets a tenth of all comments
+        hot = post_ids[0]
+        _bulk_create(Comment, (
+            Comment(
+                post_id=hot if i % 10 == 0 else rng.choice(post_ids),
+                author_id=rng.choice(author_ids), content=_text(rng, 25),
+            )
+            for i in range(comments)
+        ))
+        # bulk_create sends no signals: count them in one statement
+        counts = Comment.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(n=Count('pk'))
+        Post.objects.update(comment_count=Coalesce(Subquery(counts.values('n')[:1]), 0))
+
+    step('users', create_users)
+    step('images', create_images)
+    step('site', create_site)
+    step('products', create_products)
+    step('posts', create_posts)
+    step('comments', create_comments)
+    step('search index', rebuild_index)
+    step('related index', lambda: refresh_related_index(build=True))
+    return timings
+
+
+def default_scenarios():
+    """[(name, url, staff)] covering every public view and the manage GET views."""
+    product = Product.objects.filter(is_active=True).order_by('pk').first()
+    post = Post.objects.order_by('pk').first()
+    banner = HeroBanner.objects.first()
+    popup = Popup.objects.first()
+    page = Page.objects.first()
+    menu_item = MenuItem.objects.first()
+    category = Category.objects.first()
+    scenarios = [
+        ('home', reverse('home'), False),
+        ('product_list', reverse('product_list'), False),
+        ('product_list_category', f"{reverse('product_list')}?category={category.slug}", False),
+        ('product_detail', reverse('product_detail', args=[product.slug]), False),
+        ('post_list', reverse('post_list'), False),
+        ('post_detail', reverse('post_detail', args=[post.slug]), False),
+        ('page_detail', page.get_absolute_url(), False),
+        ('search', f"{reverse('search')}?q=velvet+gown", False),
+        ('login', reverse('login'), False),
+        ('signup', reverse('signup'), False),
+        ('home_staff', reverse('home'), True),
+        ('profile', reverse('profile'), True),
+        ('manage_dashboard', reverse('manage_dashboard'), True),
+        ('manage_create', reverse('manage_create'), True),
+        ('manage_edit', reverse('manage_edit', args=[product.pk]), True),
+        ('manage_menu', reverse('manage_menu'), True),
+        ('manage_menu_edit', reverse('manage_menu_edit', args=[menu_item.pk]), True),
+        ('manage_banner_create', reverse('manage_banner_create'), True),
+        ('manage_banner_edit', reverse('manage_banner_edit', args=[banner.pk]), True),
+        ('manage_popup_create', reverse('manage_popup_create'), True),
+        ('manage_popup_edit', reverse('manage_popup_edit', args=[popup.pk]), True),
+        ('manage_page_create', reverse('manage_page_create'), True),
+        ('manage_page_edit', reverse('manage_page_edit', args=[page.pk]), True),
+    ]
+    # The second slice of each keyset-paginated listing
+    for view, queryset in (
+        ('product_list_more', Product.objects.filter(is_active=True)),
+        ('post_list_more', Post.objects.all()),
+    ):
+        _, cursor = keyset_page(queryset)
+        if cursor:
+            scenarios.append((view, f'{reverse(view)}?cursor={cursor}', False))
+    return scenarios
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _queries(response):
+    request = getattr(response, 'wsgi_request', None) or response.asgi_request
+    return request.query_counter.count
+
+
+def _time_sync(client, url, requests, concurrency):
+    def timed(_):
+        start = time.perf_counter()
+        response = client.get(url)
+        return (time.perf_counter() - start) * 1000, response
+
+    if concurrency == 1:
+        return [timed(i) for i in range(requests)]
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(timed, range(requests)))
+
+
+async def _time_async(client, url, requests, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def timed():
+        async with slots:
+            # Like ASGIHandler: each request gets its own thread for sync code
+            async with ThreadSensitiveContext():
+                start = time.perf_counter()
+                response = await client.get(url)
+                return (time.perf_counter() - start) * 1000, response
+
+    return await asyncio.gather(*(timed() for _ in range(requests)))
+
+
+async def _async_get(client, url):
+    return await client.get(url)
+
+
+def run_scenario(client, url, requests=20, concurrency=1):
+    """Time ``requests`` GETs of ``url``, ``concurrency`` at a time, after one warm-up request.
+
+    ``client`` is a Client (WSGI) or an AsyncClient (ASGI).
+    """
+    asgi = isinstance(client, AsyncClient)
+    get = (lambda url: async_to_sync(_async_get)(client, url)) if asgi else client.get
+    get(url)
+    started = time.perf_counter()
+    if asgi:
+        timings = async_to_sync(_time_async)(client, url, requests, concurrency)
+    else:
+        timings = _time_sync(client, url, requests, concurrency)
+    elapsed = time.perf_counter() - started
+    latencies = [ms for ms, _ in timings]
+    response = timings[-1][1]
+
+    # Memory in a separate pass: tracing slows every allocation down
+    tracemalloc.start()
+    get(url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'url': url,
+        'status': response.status_code,
+        'requests': requests,
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(_percentile(latencies, 95), 2),
+        'p99_ms': round(_percentile(latencies, 99), 2),
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'rps': round(requests / elapsed, 1),
+        'queries': max(_queries(response) for _, response in timings),
+        'bytes': len(response.content),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run_scenarios(scenarios, requests=20, asgi=False, concurrency=1, log=print):
+    client_class = AsyncClient if asgi else Client
+    anonymous, staff = client_class(), client_class()
+    staff.force_login(get_user_model().objects.get(username='bench-admin'))
+    results = {}
+    for name, url, as_staff in scenarios:
+        result = results[name] = run_scenario(staff if as_staff else anonymous, url, requests, concurrency)
+        log(
+            f"  {name:<24} {result['status']}  p50 {result['p50_ms']:>8.2f}ms  "
+            f"p95 {result['p95_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms  "
+            f"{result['rps']:>7.1f} req/s  "
+            f"{result['queries']:>3} queries  {result['peak_kb']:>9.1f} KB"
+        )
+    return results
@@ -0,0 +1,189 @@
+"""Bulk changes from the manage dashboard, each in one transaction.
+
+An action is one UPDATE (or one bulk_update) however many rows it
+touches, instead of a save() per row. Neither sends model signals, so
+these functions do what the signals would have done, once per action:
+move updated_at, mirror publication onto the search entries, bump the
+cached pages and queue the related-products and sitemap refreshes.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F, Max
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .cache import HOME_PAGE, SITE_CHROME, bump_version
+from .jobs import enqueue
+
+MAX_IDS = 1000
+MAX_PERCENT = 1000  # the largest price rise, in percent
+
+# action -> past tense, for the dashboard's messages
+PRODUCT_ACTIONS = {
+    'publish': 'published',
+    'unpublish': 'unpublished',
+    'feature': 'featured',
+    'unfeature': 'unfeatured',
+    'recategorize': 'moved',
+    'reprice': 'repriced',
+    'delete': 'deleted',
+}
+
+
+class BulkActionError(ValueError):
+    pass
+
+
+def _products_changed():
+    transaction.on_commit(lambda: bump_version(HOME_PAGE))
+    enqueue('related.refresh', key='related:refresh')
+    enqueue('sitemaps.publish', key='sitemaps:publish')
+
+
+def update_products(ids, **changes):
+    """Apply ``changes`` to the products ``ids`` in one UPDATE; returns the count."""
+    from .models import Product, SearchEntry
+
+    with transaction.atomic():
+        count = Product.objects.filter(pk__in=ids).update(updated_at=timezone.now(), **changes)
+        if 'is_active' in changes:
+            SearchEntry.objects.filter(kind='product', object_id__in=ids).update(is_public=changes['is_active'])
+        _products_changed()
+    return count
+
+
+def delete_products(ids):
+    """Delete the products ``ids`` and their journal posts; returns the count.
+
+    Their image files (and gallery and content images) are released
+    through the job queue as the rows go, by the post_delete receivers.
+    """
+    from blog.models import Post
+
+    from .models import Product
+
+    with transaction.atomic():
+        Post.objects.filter(related_product__in=ids).delete()
+        _, deleted = Product.objects.filter(pk__in=ids).delete()
+    return deleted.get(Product._meta.label, 0)
+
+
+def _decimal(value, name):
+    try:
+        number = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        raise BulkActionError(f'{name} must be a number.')
+    if not number.is_finite():
+        raise BulkActionError(f'{name} must be a number.')
+    return number
+
+
+def _max_price():
+    """The largest price Product.price holds (99999999.99 for max_digits=10)."""
+    from .models import Product
+
+    field = Product._meta.get_field('price')
+    return Decimal(10) ** (field.max_digits - field.decimal_places) - Decimal(1).scaleb(-field.decimal_places)
+
+
+def apply_product_action(action, ids, options):
+    """Run one dashboard action on the products ``ids``; returns how many changed.
+
+    ``options`` carries what the action needs: ``category`` (a pk) to
+    recategorize, ``price`` or ``percent`` to reprice. Raises
+    BulkActionError on bad input, before anything is written.
+    """
+    from .models import Category, Product
+
+    if action not in PRODUCT_ACTIONS:
+        raise BulkActionError('Choose an action.')
+    try:
+        ids = sorted({int(pk) for pk in ids})
+    except (TypeError, ValueError):
+        raise BulkActionError('Invalid product selection.')
+    if not ids:
+        raise BulkActionError('Select at least one product.')
+    if len(ids) > MAX_IDS:
+        raise BulkActionError(f'At most {MAX_IDS} products at a time.')
+
+    if action == 'delete':
+        return delete_products(ids)
+    if action in ('publish', 'unpublish'):
+        return update_products(ids, is_active=action == 'publish')
+    if action in ('feature', 'unfeature'):
+        return update_products(ids, is_featured=action == 'feature')
+    if action == 'recategorize':
+        category = Category.objects.filter(pk=options.get('category') or None).first()
+        if category is None:
+            raise BulkActionError('Choose a category.')
+        return update_products(ids, category=category)
+
+    # reprice: a new price, or a percentage up or down
+    max_price = _max_price()
+    if options.get('price') not in (None, ''):
+        price = _decimal(options['price'], 'Price')
+        if price < 0:
+            raise BulkActionError('Price cannot be negative.')
+        if price > max_price:
+            raise BulkActionError(f'Price cannot be more than {max_price:,}.')
+        try:
+            price = price.quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise BulkActionError('Price must be a number.')
+        return update_products(ids, price=price)
+    percent = _decimal(options.get('percent', ''), 'Percentage')
+    if percent <= -100:
+        raise BulkActionError('A price cut must be less than 100%.')
+    if percent > MAX_PERCENT:
+        raise BulkActionError(f'A price rise can be at most {MAX_PERCENT}%.')
+    factor = 1 + percent / 100
+    highest = Product.objects.filter(pk__in=ids).aggregate(highest=Max('price'))['highest'] or 0
+    if highest * factor > max_price:
+        raise BulkActionError(f'That would price some products above {max_price:,}.')
+    return update_products(ids, price=Round(F('price') * factor, 2))
+
+
+def reorder(queryset, ordered_ids, field, start=0):
+    """Number the rows of ``queryset`` in ``ordered_ids`` order, from ``start``.
+
+    Rows not listed keep their value. One bulk_update of the rows that
+    moved; returns how many did.
+    """
+    ordered_ids = [int(pk) for pk in ordered_ids]
+    with transaction.atomic():
+        rows = {
+            obj.pk: obj
+            for obj in queryset.filter(pk__in=ordered_ids).select_for_update().only('pk', field)
+        }
+        moved = []
+        for position, pk in enumerate(ordered_ids, start):
+            obj = rows.get(pk)
+            if obj is not None and getattr(obj, field) != position:
+                setattr(obj, field, position)
+                moved.append(obj)
+        queryset.model.objects.bulk_update(moved, [field])
+    return len(moved)
+
+
+def reorder_menu(ordered_ids):
+    from .models import MenuItem
+
+    moved = reorder(MenuItem.objects.all(), ordered_ids, 'display_order')
+    if moved:
+        transaction.on_commit(lambda: bump_version(SITE_CHROME))
+    return moved
+
+
+def reorder_content_images(product, ordered_ids):
+    """Renumber ``product``'s content images; its [img:N] tags follow the new numbers."""
+    with transaction.atomic():
+        moved = reorder(product.content_images.all(), ordered_ids, 'number', start=1)
+        if moved:
+            product.recompile_content()
+    return moved
+
+
+def renumber_content_images(product):
+    """Close the gaps left in ``product``'s content image numbers (1, 2, 3, ...)."""
+    return reorder_content_images(product, product.content_images.values_list('pk', flat=True))
@@ -0,0 +1,37 @@
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+# Version stamp names
+SITE_CHROME = 'site-chrome'
+HOME_PAGE = 'home-page'
+PAGES = 'pages'
+RENDITIONS = 'renditions'
+
+
+def _stamp_path(name):
+    return Path(settings.STATE_DIR) / 'versions' / name
+
+
+def get_version(name):
+    """Return the current stamp for ``name``, or 0 if it was never bumped.
+
+    Stamps live on disk so every gunicorn worker sees a bump made by any
+    other worker; checking one costs a single stat() and no query.
+    """
+    try:
+        return os.stat(_stamp_path(name)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def bump_version(name):
+    """Invalidate everything cached under ``name`` in all workers."""
+    path = _stamp_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    stamp = max(time.time_ns(), get_version(name) + 1)
+    path.touch()
+    os.utime(path, ns=(stamp, stamp))
+    return stamp
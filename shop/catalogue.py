@@ -0,0 +1,366 @@
+"""Bulk catalogue import and export (``import_catalogue`` / ``export_catalogue``).
+
+A catalogue is a CSV or JSONL file with one product per record, plus an
+optional zip archive holding the image files the records refer to:
+
+    slug, name, category, price, stock, description, is_active,
+    is_featured, image, gallery, content_images
+
+``gallery`` and ``content_images`` are lists of archive member names
+(``|``-separated in CSV); content image N is the Nth entry, matching the
+``[img:N]`` tags in the description. Both directions stream records and
+image files, so memory use does not grow with the catalogue.
+"""
+import csv
+import json
+import posixpath
+import shutil
+import zipfile
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .content import content_image_map
+from .jobs import enqueue_many
+from .search import index_objects
+from .storage import blob_storage
+
+FIELDS = (
+    'slug', 'name', 'category', 'price', 'stock', 'description',
+    'is_active', 'is_featured', 'image', 'gallery', 'content_images',
+)
+LIST_FIELDS = ('gallery', 'content_images')
+LIST_SEPARATOR = '|'
+SLUG_QUERY_CHUNK = 100
+SLUG_SUFFIX_ROOM = len('-NNNN')
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+
+
+class CatalogueError(ValueError):
+    pass
+
+
+# ── Reading and writing records ──
+
+
+def catalogue_format(path, fmt=None):
+    fmt = fmt or ('csv' if str(path).lower().endswith('.csv') else 'jsonl')
+    if fmt not in ('csv', 'jsonl'):
+        raise CatalogueError(f'Unknown catalogue format: {fmt}')
+    return fmt
+
+
+def read_records(f, fmt):
+    """Yield (line number, raw record) from an open text file.
+
+    A record that cannot be decoded is yielded as a CatalogueError, so
+    the caller can report it and carry on.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(f)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError as e:
+                    yield number, CatalogueError(f'invalid JSON: {e}')
+
+
+class RecordWriter:
+    def __init__(self, f, fmt):
+        self.fmt = fmt
+        self.f = f
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(f, fieldnames=FIELDS)
+            self.writer.writeheader()
+
+    def write(self, record):
+        if self.fmt == 'csv':
+            self.writer.writerow({
+                key: LIST_SEPARATOR.join(value) if key in LIST_FIELDS else value
+                for key, value in record.items()
+            })
+        else:
+            self.f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+# ── Slugs ──
+
+
+def slug_base(value, max_length):
+    """slugify(value), cut to ``max_length`` without a trailing hyphen."""
+    return slugify(value)[:max_length].rstrip('-')
+
+
+def allocate_slugs(model, bases):
+    """Unique slugs for ``bases``, like _unique_slug() but a query per 100 bases.
+
+    Taken slugs get the first free ``-N`` suffix; duplicates within
+    ``bases`` are kept apart as well. Bases are cut to fit the slug
+    field, and cut again to make room for a suffix.
+    """
+    max_length = model._meta.get_field('slug').max_length
+    bases = [slug_base(base, max_length) or 'item' for base in bases]
+    wanted = sorted(set(bases))
+    taken = set()
+    for start in range(0, len(wanted), SLUG_QUERY_CHUNK):
+        chunk = wanted[start:start + SLUG_QUERY_CHUNK]
+        query = Q(slug__in=chunk)
+        for base in chunk:
+            if len(base) > max_length - SLUG_SUFFIX_ROOM:
+                query |= Q(slug__startswith=base[:max_length - SLUG_SUFFIX_ROOM])
+            else:
+                query |= Q(slug__startswith=f'{base}-')
+        taken.update(model.objects.filter(query).values_list('slug', flat=True))
+
+    slugs = []
+    for base in bases:
+        slug, counter = base, 1
+        while slug in taken:
+            suffix = f'-{counter}'
+            slug = base[:max_length - len(suffix)] + suffix
+            counter += 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+# ── Import ──
+
+
+@dataclass
+class ImportRecord:
+    name: str
+    category: str
+    description: str
+    price: Decimal
+    stock: int
+    is_active: bool
+    is_featured: bool
+    slug: str = ''
+    image: str = ''
+    gallery: list = field(default_factory=list)
+    content_images: list = field(default_factory=list)
+
+
+def _bool(value, default):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def parse_record(raw):
+    """Validate one raw record into an ImportRecord; raises CatalogueError."""
+    from .models import Product
+
+    if isinstance(raw, Exception):
+        raise raw
+    if not isinstance(raw, dict):
+        raise CatalogueError('record is not an object')
+    name = str(raw.get('name') or '').strip()
+    category = str(raw.get('category') or '').strip()
+    if not name:
+        raise CatalogueError('name is required')
+    if not category:
+        raise CatalogueError('category is required')
+    try:
+        price = Decimal(str(raw.get('price') or 0))
+        stock = int(raw.get('stock') or 0)
+    except (InvalidOperation, ValueError):
+        raise CatalogueError('price and stock must be numbers')
+    if price < 0 or stock < 0:
+        raise CatalogueError('price and stock cannot be negative')
+    lists = {}
+    for name_ in LIST_FIELDS:
+        value = raw.get(name_) or []
+        if isinstance(value, str):
+            value = [v for v in value.split(LIST_SEPARATOR) if v]
+        lists[name_] = [str(v).strip() for v in value]
+    return ImportRecord(
+        name=name[:200],
+        category=category[:100],
+        description=str(raw.get('description') or ''),
+        price=price.quantize(Decimal('0.01')),
+        stock=stock,
+        is_active=_bool(raw.get('is_active'), True),
+        is_featured=_bool(raw.get('is_featured'), False),
+        # Without one, the slug the name would get: what a re-run matches on
+        slug=slug_base(raw.get('slug') or name[:200], Product._meta.get_field('slug').max_length),
+        image=str(raw.get('image') or '').strip(),
+        **lists,
+    )
+
+
+class ImageArchive:
+    """Copies image files out of a zip archive into image storage."""
+
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path) if path else None
+        self.missing = []
+
+    def save(self, member, upload_to):
+        """Storage name of the copied file, or '' if it is not in the archive."""
+        if not member:
+            return ''
+        if self.zip is None:
+            self.missing.append(member)
+            return ''
+        try:
+            source = self.zip.open(member)
+        except KeyError:
+            self.missing.append(member)
+            return ''
+        with source:
+            name = posixpath.join(upload_to, posixpath.basename(member))
+            return blob_storage().save(name, File(source, name=name))
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+
+
+def get_categories(names, categories):
+    """Fill ``categories`` ({lowercased name: Category}) with ``names``, creating missing ones."""
+    from .models import Category
+
+    missing = {name.lower(): name for name in names if name.lower() not in categories}
+    if not missing:
+        return categories
+    for category in Category.objects.all():
+        categories.setdefault(category.name.lower(), category)
+    new = [name for key, name in missing.items() if key not in categories]
+    created = Category.objects.bulk_create([
+        Category(name=name, slug=slug) for name, slug in zip(new, allocate_slugs(Category, new))
+    ])
+    categories.update((category.name.lower(), category) for category in created)
+    return categories
+
+
+def import_batch(records, archive, categories, author=None):
+    """Insert a batch of ImportRecords with a handful of bulk queries.
+
+    Records whose slug already exists (or, for a name that makes no
+    slug, whose name does) are skipped, so re-running an import is safe. Fills in everything save() and signals would have:
+    compiled descriptions, search entries and rendition jobs. With an
+    ``author``, each product also gets a journal post, like the web form.
+    Returns (products created, records skipped).
+    """
+    from blog.models import Post
+
+    from .models import ContentImage, Product, ProductImage
+
+    existing = set(Product.objects.filter(
+        slug__in=[r.slug for r in records if r.slug],
+    ).values_list('slug', flat=True))
+    existing_names = set(Product.objects.filter(
+        name__in=[r.name for r in records if not r.slug],
+    ).values_list('name', flat=True))
+    new_records = [
+        r for r in records
+        if (r.slug not in existing if r.slug else r.name not in existing_names)
+    ]
+    if not new_records:
+        return [], len(records)
+    get_categories({r.category for r in new_records}, categories)
+
+    products = []
+    slugs = allocate_slugs(Product, [r.slug or r.name for r in new_records])
+    for record, slug in zip(new_records, slugs):
+        product = Product(
+            name=record.name, slug=slug, category=categories[record.category.lower()],
+            price=record.price, stock=record.stock, description=record.description,
+            is_active=record.is_active, is_featured=record.is_featured,
+            image=archive.save(record.image, 'products/') or None,
+        )
+        product.compile_description({})
+        products.append(product)
+    Product.objects.bulk_create(products)
+
+    gallery, content = [], []
+    for product, record in zip(products, new_records):
+        for order, member in enumerate(record.gallery):
+            name = archive.save(member, 'products/gallery/')
+            if name:
+                gallery.append(ProductImage(product=product, image=name, order=order))
+        for number, member in enumerate(record.content_images, 1):
+            name = archive.save(member, 'products/content/')
+            if name:
+                content.append(ContentImage(product=product, image=name, number=number))
+    ProductImage.objects.bulk_create(gallery)
+    ContentImage.objects.bulk_create(content)
+
+    # [img:N] tags need the content images' URLs
+    image_maps = defaultdict(list)
+    for image in content:
+        image_maps[image.product_id].append(image)
+    image_maps = {pk: content_image_map(images) for pk, images in image_maps.items()}
+    changed = [p for p in products if p.pk in image_maps and p.compile_description(image_maps[p.pk])]
+    Product.objects.bulk_update(changed, ['description_html', 'description_hash'])
+
+    posts = []
+    if author is not None:
+        for product, slug in zip(products, allocate_slugs(Post, [p.name for p in products])):
+            post = Post(
+                title=product.name, slug=slug, content=product.description,
+                author=author, related_product=product,
+            )
+            post.compile_content(image_maps.get(product.pk, {}))
+            posts.append(post)
+        Post.objects.bulk_create(posts)
+
+    index_objects(products)
+    index_objects(posts)
+    rendition_jobs = [
+        (f'renditions:{obj._meta.label}:{obj.pk}:{obj.image.name}',
+         {'model': obj._meta.label, 'pk': obj.pk, 'field': 'image'})
+        for obj in [p for p in products if p.image] + gallery + content
+    ]
+    enqueue_many('images.renditions', rendition_jobs)
+    return products, len(records) - len(new_records)
+
+
+# ── Export ──
+
+
+def export_record(product):
+    return {
+        'slug': product.slug,
+        'name': product.name,
+        'category': product.category.name,
+        'price': str(product.price),
+        'stock': product.stock,
+        'description': product.description,
+        'is_active': product.is_active,
+        'is_featured': product.is_featured,
+        'image': product.image.name if product.image else '',
+        'gallery': [img.image.name for img in product.images.all()],
+        'content_images': [img.image.name for img in product.content_images.all()],
+    }
+
+
+def archive_images(zf, names):
+    """Stream storage files into the open zip ``zf``; returns the names not found."""
+    missing = []
+    for name in names:
+        if not name or name in zf.NameToInfo:
+            continue
+        try:
+            source = default_storage.open(name)
+        except FileNotFoundError:
+            missing.append(name)
+            continue
+        with source, zf.open(name, 'w') as target:
+            shutil.copyfileobj(source, target)
+    return missing
+
@@ -0,0 +1,114 @@
+"""Conditional GET for detail pages.
+
+Django's ``condition`` decorator calls its ETag and Last-Modified
+functions separately; ``conditional_page`` takes one function returning
+both, so the validators cost a single query. A request that still holds
+the current page gets a 304 before the view or its templates run.
+"""
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib import messages
+from django.db.models import Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .cache import SITE_CHROME, get_version
+from .metrics import cache_lookup
+from .theme import stylesheet_name, stylesheet_version
+
+
+def aggregate_subquery(queryset, group_by, expression):
+    """``expression`` aggregated over ``queryset`` as a scalar subquery."""
+    return Subquery(queryset.order_by().values(group_by).annotate(value=expression).values('value')[:1])
+
+
+def page_validators(request, *parts, last_modified=None):
+    """(weak ETag, last_modified) for a page built from ``parts``.
+
+    Adds what every page shares: the menus and site settings, the
+    stylesheet build, and who is looking (staff see extra links, members
+    see their own nav and forms tied to their CSRF secret). Those move
+    last_modified too, so If-Modified-Since alone never gets a stale 304.
+    """
+    user = request.user
+    chrome = get_version(SITE_CHROME)
+    parts = (chrome, stylesheet_name(), user.pk, user.is_staff) + parts
+    if last_modified:
+        for stamp in (chrome, stylesheet_version()):
+            if stamp:
+                last_modified = max(last_modified, datetime.fromtimestamp(stamp / 1e9, dt_timezone.utc))
+    if user.is_authenticated:
+        # Members' pages carry CSRF tokens (comment form, logout): a new
+        # secret, as after logging in again, must not revalidate an old copy
+        parts += (request.META.get('CSRF_COOKIE'),)
+        if user.last_login and last_modified:
+            last_modified = max(last_modified, user.last_login)
+    digest = hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()
+    # Weak: the markup differs between renders (CSRF tokens) but means the same
+    return f'W/"{digest}"', last_modified
+
+
+def _validate(request, validators, args, kwargs):
+    """(etag, timestamp, 304 response or None), or None to just run the view."""
+    # Pending flash messages are shown (and consumed) by a render
+    if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+        return None
+    result = validators(request, *args, **kwargs)
+    if result is None:
+        return None
+    etag, last_modified = result
+    timestamp = last_modified and int(last_modified.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers:
+        # A hit is a page the browser already holds
+        cache_lookup(request, 'conditional_get', response is not None)
+    return etag, timestamp, response
+
+
+def _add_validators(request, response, etag, timestamp):
+    if response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        if timestamp:
+            response.headers.setdefault('Last-Modified', http_date(timestamp))
+        # Always revalidate; never share a member's page
+        patch_cache_control(response, no_cache=True)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True)
+    return response
+
+
+def conditional_page(validators):
+    """Answer If-None-Match / If-Modified-Since with a 304 when possible.
+
+    ``validators(request, *args, **kwargs)`` returns (etag, last_modified)
+    from page_validators(), or None to let the view run (e.g. to 404).
+    Async views are wrapped by an async wrapper; the validators still run
+    synchronously, in a thread.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                checked = await sync_to_async(_validate)(request, validators, args, kwargs)
+                if checked is None:
+                    return await view_func(request, *args, **kwargs)
+                etag, timestamp, response = checked
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                return await sync_to_async(_add_validators)(request, response, etag, timestamp)
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            checked = _validate(request, validators, args, kwargs)
+            if checked is None:
+                return view_func(request, *args, **kwargs)
+            etag, timestamp, response = checked
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+            return _add_validators(request, response, etag, timestamp)
+        return wrapper
+    return decorator
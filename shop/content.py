@@ -0,0 +1,51 @@
+import hashlib
+import re
+
+from django.utils.html import escape
+
+from .renditions import srcsets
+
+IMG_TAG_RE = re.compile(r'\[img:(\d+)\]')
+
+
+def render_rich_content(text, image_map):
+    """Replace [img:N] tags with actual images, then apply linebreaks."""
+    text = escape(text)
+
+    def replace_tag(match):
+        num = int(match.group(1))
+        image = image_map.get(num)
+        if image:
+            url, sources = image
+            sources = ''.join(
+                f'<source type="{mime}" srcset="{srcset}" sizes="(min-width: 896px) 832px, 100vw">'
+                for mime, srcset in sources
+            )
+            return (
+                f'</p>'
+                f'<figure class="my-8">'
+                f'<picture class="contents">{sources}'
+                f'<img src="{url}" alt="" class="w-full rounded-lg shadow-md" loading="lazy" decoding="async">'
+                f'</picture>'
+                f'</figure>'
+                f'<p>'
+            )
+        return match.group(0)
+
+    text = IMG_TAG_RE.sub(replace_tag, text)
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+    return '\n'.join(f'<p class="mb-4">{p.replace(chr(10), "<br>")}</p>' for p in paragraphs)
+
+
+def source_hash(text, image_map=None):
+    """Fingerprint of everything the compiled HTML depends on."""
+    digest = hashlib.sha256(text.encode())
+    for number, url in sorted((image_map or {}).items()):
+        digest.update(f'\0{number}={url}'.encode())
+    return digest.hexdigest()
+
+
+def content_image_map(content_images):
+    """{number: (url, [(mime type, srcset)])} for a product's content images."""
+    return {img.number: (img.image.url, srcsets(img.image)) for img in content_images if img.image}
@@ -1,16 +1,52 @@
+from dataclasses import dataclass
+
+from .cache import SITE_CHROME, get_version
 from .models import MenuItem, SiteSetting
+from .theme import stylesheet_name
 
 
-def menu_context(request):
-    active_items = MenuItem.objects.filter(is_active=True)
+@dataclass(frozen=True)
+class SiteChrome:
+    version: int
+    header_menu: tuple
+    footer_account_menu: tuple
+    site_settings: object
+
+
+_chrome = None
+
+
+def _build_site_chrome(version):
+    items = tuple(MenuItem.objects.filter(is_active=True))
     try:
         site_settings = SiteSetting.objects.first()
     except Exception:
         site_settings = None
-    header_items = active_items.filter(location='header')
+    return SiteChrome(
+        version=version,
+        header_menu=tuple(i for i in items if i.location == 'header'),
+        footer_account_menu=tuple(i for i in items if i.location == 'footer_account'),
+        site_settings=site_settings,
+    )
+
+
+def get_site_chrome():
+    """Menus and site settings, loaded once per worker until invalidated."""
+    global _chrome
+    version = get_version(SITE_CHROME)
+    chrome = _chrome
+    if chrome is None or chrome.version != version:
+        chrome = _chrome = _build_site_chrome(version)
+    return chrome
+
+
+def menu_context(request):
+    chrome = get_site_chrome()
     return {
-        'header_menu': header_items,
-        'footer_nav_menu': header_items,
-        'footer_account_menu': active_items.filter(location='footer_account'),
-        'site_settings': site_settings,
+        'header_menu': chrome.header_menu,
+        'footer_nav_menu': chrome.header_menu,
+        'footer_account_menu': chrome.footer_account_menu,
+        'site_settings': chrome.site_settings,
+        'stylesheet': stylesheet_name(),
+        'theme_version': chrome.version,
     }
@@ -1,4 +1,5 @@
 from django import forms
+from .imaging import validate_image
 from .models import Product, Category
 
 
@@ -17,7 +18,7 @@ class ProductPostForm(forms.Form):
             'placeholder': 'Write your description and story...',
         }),
     )
-    image = forms.ImageField(required=False)
+    image = forms.ImageField(required=False, validators=[validate_image])
     is_featured = forms.BooleanField(required=False, label='Feature on homepage')
 
 
@@ -26,7 +27,7 @@ class HeroBannerForm(forms.Form):
         widget=forms.TextInput(attrs={'placeholder': 'Banner title (optional)'}))
     subtitle = forms.CharField(required=False,
         widget=forms.Textarea(attrs={'rows': 3, 'placeholder': 'Subtitle text (optional)'}))
-    image = forms.ImageField(required=True)
+    image = forms.ImageField(required=True, validators=[validate_image])
     link_url = forms.URLField(required=False,
         widget=forms.URLInput(attrs={'placeholder': 'https://...'}))
     is_active = forms.BooleanField(required=False, initial=True)
@@ -49,7 +50,7 @@ class PopupForm(forms.Form):
     popup_type = forms.ChoiceField(choices=POPUP_TYPE_CHOICES)
     content = forms.CharField(required=False,
         widget=forms.Textarea(attrs={'rows': 5, 'placeholder': 'Announcement text...'}))
-    image = forms.ImageField(required=False)
+    image = forms.ImageField(required=False, validators=[validate_image])
     link_url = forms.URLField(required=False,
         widget=forms.URLInput(attrs={'placeholder': 'https://... (optional link)'}))
     is_active = forms.BooleanField(required=False, initial=True)
@@ -0,0 +1,211 @@
+"""Decoding and re-encoding uploads with bounded memory.
+
+Every path that decodes an image goes through open_image() and
+decode_image(). They:
+
+- reject decompression bombs from the header alone;
+- have the JPEG decoder work at a reduced scale (draft mode decodes at
+  1/2, 1/4 or 1/8 size for a fraction of the memory);
+- refuse anything that would still decode to more than
+  IMAGE_DECODE_PIXELS.
+
+The EXIF orientation is applied last, to the cropped or reduced image,
+so that transposing never copies a full-size decode.
+
+Re-encoded images are spooled to temporary files on disk rather than
+held in memory. They keep their colour profile and no other metadata.
+"""
+import posixpath
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+
+ORIENTATION = 0x0112
+TRANSPOSED = {5, 6, 7, 8}  # orientations that swap width and height
+DRAFT_FORMATS = {'JPEG'}   # decoders that can reduce while decoding
+MAX_DRAFT_REDUCTION = 8
+JPEG_OPTIONS = {'quality': 90, 'progressive': True, 'optimize': True}
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def check_image(img):
+    """Raise ImageTooLarge unless ``img`` (opened, not loaded) can be decoded within budget."""
+    width, height = img.size
+    pixels = width * height
+    if pixels > settings.IMAGE_MAX_PIXELS:
+        raise ImageTooLarge(
+            f'{width}×{height} is more than {settings.IMAGE_MAX_PIXELS:,} pixels.'
+        )
+    reduction = MAX_DRAFT_REDUCTION ** 2 if img.format in DRAFT_FORMATS else 1
+    if pixels / reduction > settings.IMAGE_DECODE_PIXELS:
+        raise ImageTooLarge(
+            f'{width}×{height} is too large to process as {img.format}; '
+            f'save it as a JPEG or reduce it first.'
+        )
+
+
+def validate_image(value):
+    """Form field validator: forms.ImageField leaves the opened image on ``value.image``."""
+    image = getattr(value, 'image', None)
+    if image is not None:
+        try:
+            check_image(image)
+        except ImageTooLarge as e:
+            raise ValidationError(str(e), code='image_too_large')
+
+
+def open_image(f):
+    """Open ``f`` without decoding it, after checking its header."""
+    from PIL import Image
+
+    f.seek(0)
+    try:
+        img = Image.open(f)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+    check_image(img)
+    return img
+
+
+def orientation(img):
+    return img.getexif().get(ORIENTATION, 1)
+
+
+def oriented_size(img):
+    """(width, height) of ``img`` once its EXIF orientation is applied."""
+    width, height = img.size
+    if orientation(img) in TRANSPOSED:
+        return height, width
+    return width, height
+
+
+def decode_image(img, scale=1.0):
+    """Load ``img`` at no less than ``scale`` of its full size.
+
+    A JPEG that would decode to more than IMAGE_DECODE_PIXELS is decoded
+    smaller instead. Returns (image, factor), factor being the decoded
+    size over the full size, for scaling coordinates taken on the full
+    image. The image is not turned upright yet: do that once it is as
+    small as it will get (see upright()).
+    """
+    full_width = img.width
+    pixels = img.width * img.height
+    # Draft reduces by 2, 4 or 8: as far as ``scale`` allows, and further
+    # if that is what it takes to stay within budget
+    reduction = 1
+    while reduction < MAX_DRAFT_REDUCTION and (
+        1 / (reduction * 2) >= scale or pixels / reduction ** 2 > settings.IMAGE_DECODE_PIXELS
+    ):
+        reduction *= 2
+    if reduction > 1:
+        img.draft('RGB', (img.width // reduction, img.height // reduction))
+    if img.width * img.height > settings.IMAGE_DECODE_PIXELS:
+        raise ImageTooLarge(f'{img.width}×{img.height} is too large to process.')
+    img.load()
+    return img, img.width / full_width
+
+
+def upright(img, turn):
+    """``img`` transposed as the EXIF orientation ``turn`` says."""
+    from PIL import Image
+
+    method = {
+        2: Image.Transpose.FLIP_LEFT_RIGHT,
+        3: Image.Transpose.ROTATE_180,
+        4: Image.Transpose.FLIP_TOP_BOTTOM,
+        5: Image.Transpose.TRANSPOSE,
+        6: Image.Transpose.ROTATE_270,
+        7: Image.Transpose.TRANSVERSE,
+        8: Image.Transpose.ROTATE_90,
+    }.get(turn)
+    return img.transpose(method) if method is not None else img
+
+
+def _stored_box(box, size, turn):
+    """Map a (left, top, right, bottom) box on the upright image back onto
+    the image as stored, ``size`` being the stored (width, height).
+    """
+    width, height = size
+    left, top, right, bottom = box
+    if turn in TRANSPOSED:
+        # Swap axes first; 6 and 7 then mirror the new y, 7 and 8 the new x
+        left, top, right, bottom = top, left, bottom, right
+        if turn in (6, 7):
+            top, bottom = height - bottom, height - top
+        if turn in (7, 8):
+            left, right = width - right, width - left
+    else:
+        if turn in (2, 3):
+            left, right = width - right, width - left
+        if turn in (3, 4):
+            top, bottom = height - bottom, height - top
+    return left, top, right, bottom
+
+
+def spool_image(img, name, keep_alpha=True):
+    """Encode ``img`` into a temporary file named after ``name``.
+
+    JPEG, or PNG when it has transparency worth keeping.
+    """
+    alpha = keep_alpha and (img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info)
+    if alpha:
+        fmt, ext, options = 'PNG', 'png', {'optimize': True}
+        mode = 'RGBA'
+    else:
+        fmt, ext, options = 'JPEG', 'jpg', JPEG_OPTIONS
+        mode = 'RGB'
+    icc_profile = img.info.get('icc_profile')
+    if img.mode != mode:
+        img = img.convert(mode)
+
+    # Anonymous, so storage copies it (the same upload may be saved twice)
+    # and the OS removes it on close
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+    spooled = File(tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR), name=f'{stem}.{ext}')
+    img.save(spooled.file, format=fmt, icc_profile=icc_profile, **options)
+    spooled.size = spooled.file.tell()
+    spooled.seek(0)
+    return spooled
+
+
+def ingest_image(f):
+    """An upload ready to store: upright, at most IMAGE_MAX_SIDE, without metadata.
+
+    Raises ImageTooLarge. Animated images are stored as uploaded.
+    """
+    img = open_image(f)
+    if getattr(img, 'is_animated', False):
+        f.seek(0)
+        return f
+    turn = orientation(img)
+    max_side = settings.IMAGE_MAX_SIDE
+    img, _ = decode_image(img, min(1.0, max_side / max(img.size)))
+    img.thumbnail((max_side, max_side))
+    return spool_image(upright(img, turn), f.name)
+
+
+def crop_image(image_file, crop_x, crop_y, crop_width, crop_height):
+    """Crop an image using coordinates from Cropper.js (full-size, upright pixels).
+
+    Only the scale the crop needs is decoded; the box is scaled to match.
+    """
+    img = open_image(image_file)
+    width, height = oriented_size(img)
+    left, top = max(0, int(crop_x)), max(0, int(crop_y))
+    right = min(width, int(crop_x + crop_width))
+    bottom = min(height, int(crop_y + crop_height))
+    if crop_width <= 0 or crop_height <= 0 or right <= left or bottom <= top:
+        left, top, right, bottom = 0, 0, width, height
+
+    turn = orientation(img)
+    box = _stored_box((left, top, right, bottom), img.size, turn)
+    max_side = settings.IMAGE_MAX_SIDE
+    img, factor = decode_image(img, min(1.0, max_side / max(right - left, bottom - top)))
+    img = img.crop(tuple(round(v * factor) for v in box))
+    img.thumbnail((max_side, max_side))
+    return spool_image(upright(img, turn), image_file.name, keep_alpha=False)
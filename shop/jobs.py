@@ -0,0 +1,120 @@
+"""Database-backed background jobs.
+
+Slow work (image cropping, renditions, file cleanup) is queued as Job
+rows and executed by ``manage.py run_jobs`` outside the request path.
+Tasks register themselves with the ``@task`` decorator in shop/tasks.py.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+RETRY_DELAY = 30  # seconds, doubled after every failed attempt
+STALE_AFTER = timedelta(minutes=15)
+
+
+def task(name):
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, key='', max_attempts=3, **payload):
+    """Queue ``name`` to run with ``payload``.
+
+    A non-empty ``key`` deduplicates: nothing is queued while a job with
+    the same key is still waiting.
+    """
+    if key and Job.objects.filter(key=key, status='queued').exists():
+        return None
+    job = Job.objects.create(task=name, key=key, payload=payload, max_attempts=max_attempts)
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: _claim_and_run(job.pk))
+    return job
+
+
+def enqueue_many(name, jobs, max_attempts=3):
+    """Queue many ``name`` jobs in one insert; ``jobs`` is [(key, payload)].
+
+    Unlike enqueue() there is no deduplication: meant for work on rows
+    that were just created, which nothing can have queued yet.
+    """
+    created = Job.objects.bulk_create([
+        Job(task=name, key=key, payload=payload, max_attempts=max_attempts) for key, payload in jobs
+    ])
+    if settings.JOBS_EAGER:
+        for job in created:
+            transaction.on_commit(lambda pk=job.pk: _claim_and_run(pk))
+    return created
+
+
+def _claim(pk):
+    now = timezone.now()
+    claimed = Job.objects.filter(pk=pk, status='queued').update(
+        status='running', attempts=F('attempts') + 1, updated_at=now,
+    )
+    return Job.objects.get(pk=pk) if claimed else None
+
+
+def _claim_and_run(pk):
+    job = _claim(pk)
+    if job:
+        run_job(job)
+    return job
+
+
+def run_next():
+    """Claim and run the oldest due job. Returns it, or None if idle."""
+    due = Job.objects.filter(status='queued', run_after__lte=timezone.now())
+    for pk in due.order_by('run_after', 'pk').values_list('pk', flat=True)[:10]:
+        # Claiming is a conditional UPDATE, so concurrent workers never
+        # run the same job twice
+        job = _claim_and_run(pk)
+        if job:
+            return job
+    return None
+
+
+def run_job(job):
+    func = TASKS.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f'Unknown task {job.task!r}')
+        func(**job.payload)
+    except Exception:
+        logger.exception('Job %s failed (attempt %s/%s)', job, job.attempts, job.max_attempts)
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+        else:
+            job.status = 'queued'
+            job.run_after = timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+    else:
+        job.status = 'done'
+        job.last_error = ''
+    job.save(update_fields=['status', 'last_error', 'run_after', 'updated_at'])
+
+
+def requeue_stale():
+    """Put back jobs left 'running' by a worker that died mid-task."""
+    return Job.objects.filter(
+        status='running', updated_at__lt=timezone.now() - STALE_AFTER,
+    ).update(status='queued', updated_at=timezone.now())
+
+
+def prune_done():
+    """Delete jobs finished more than JOBS_KEEP_DAYS ago; failed ones stay for a look."""
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'JOBS_KEEP_DAYS', 7))
+    deleted, _ = Job.objects.filter(status='done', updated_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,143 @@
+import json
+import platform
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from shop.benchmark import default_scenarios, generate_catalogue, run_scenarios
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic catalogue in a throwaway test database, time every public '
+        'and manage view, and write the results to JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=500)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--images', type=int, default=24, help='Distinct image files to generate')
+        parser.add_argument('--renditions', action='store_true', help='Also generate image renditions')
+        parser.add_argument('--requests', type=int, default=20, help='Timed requests per view')
+        parser.add_argument('--asgi', action='store_true',
+                            help='Serve the requests through the ASGI handler, as uvicorn workers do')
+        parser.add_argument('--concurrency', type=int, default=1, help='Requests in flight at once')
+        parser.add_argument('--only', nargs='+', metavar='NAME', help='Run only these scenarios')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database afterwards')
+        parser.add_argument('--output', help='JSON file to write (default: STATE_DIR/bench/<timestamp>.json)')
+        parser.add_argument('--compare', metavar='JSON', help='Print the change against an earlier run')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = json.loads(Path(options['compare']).read_text())
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        output = Path(options['output'] or Path(settings.STATE_DIR) / 'bench' / (
+            timezone.now().strftime('%Y%m%d-%H%M%S') + '.json'
+        ))
+
+        # Never touch the real database, media or version stamps
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            with tempfile.TemporaryDirectory(prefix='atelier-bench-') as tmp, override_settings(
+                MEDIA_ROOT=str(Path(tmp) / 'media'),
+                STATE_DIR=Path(tmp) / 'state',
+                ALLOWED_HOSTS=['*'],
+                JOBS_EAGER=False,
+                QUERY_BUDGET_STRICT=False,
+            ):
+                report = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2) + '\n')
+        self.stdout.write(self.style.SUCCESS(f'Wrote {output}'))
+        if baseline:
+            self.compare(baseline, report)
+
+    def run(self, options):
+        sizes = {key: options[key] for key in ('products', 'posts', 'comments', 'users', 'images')}
+        self.stdout.write(f'Generating catalogue {sizes}')
+        generation = generate_catalogue(
+            renditions=options['renditions'], seed=options['seed'], log=self.stdout.write, **sizes,
+        )
+
+        scenarios = default_scenarios()
+        if options['only']:
+            scenarios = [s for s in scenarios if s[0] in options['only']]
+        mode = 'asgi' if options['asgi'] else 'wsgi'
+        concurrency = max(1, options['concurrency'])
+        self.stdout.write(
+            f"Timing {len(scenarios)} views, {options['requests']} requests each "
+            f"({mode.upper()}, {concurrency} at a time)"
+        )
+        started = time.perf_counter()
+        results = run_scenarios(
+            scenarios, requests=options['requests'], asgi=options['asgi'], concurrency=concurrency,
+            log=self.stdout.write,
+        )
+
+        return {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'commit': _git_commit(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'sizes': sizes,
+                'renditions': options['renditions'],
+                'requests': options['requests'],
+                'mode': mode,
+                'concurrency': concurrency,
+                'seed': options['seed'],
+                'generation_seconds': generation,
+                'timing_seconds': round(time.perf_counter() - started, 3),
+            },
+            'scenarios': results,
+        }
+
+    def compare(self, baseline, report):
+        meta = baseline['meta']
+        self.stdout.write(
+            f"\nChange against {meta.get('commit') or 'baseline'} "
+            f"({meta.get('mode', 'wsgi').upper()}, {meta.get('concurrency', 1)} at a time):"
+        )
+        for name, result in report['scenarios'].items():
+            before = baseline['scenarios'].get(name)
+            if not before:
+                continue
+            p95 = result['p95_ms'] - before['p95_ms']
+            pct = f' ({p95 / before["p95_ms"]:+.0%})' if before['p95_ms'] else ''
+            self.stdout.write(
+                f"  {name:<24} p95 {before['p95_ms']:>8.2f} -> {result['p95_ms']:>8.2f}ms{pct}  "
+                f"req/s {before.get('rps', '-')} -> {result['rps']}  "
+                f"queries {before['queries']} -> {result['queries']}  "
+                f"peak {before['peak_kb']} -> {result['peak_kb']} KB"
+            )
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
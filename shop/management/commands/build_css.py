@@ -0,0 +1,43 @@
+import hashlib
+import json
+import shlex
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.theme import STYLESHEET_MANIFEST, generated_path, write_atomic, write_theme_css
+
+
+class Command(BaseCommand):
+    help = 'Compile the Tailwind stylesheet and theme colours into STATIC_GENERATED_DIR'
+
+    def handle(self, *args, **options):
+        write_theme_css()
+
+        css_dir = generated_path('css')
+        build = css_dir / 'site.build.css'
+        cmd = shlex.split(settings.TAILWIND_CLI) + [
+            '--config', str(settings.BASE_DIR / 'tailwind.config.js'),
+            '--input', str(settings.BASE_DIR / 'assets' / 'tailwind.css'),
+            '--output', str(build),
+            '--minify',
+        ]
+        try:
+            subprocess.run(cmd, cwd=settings.BASE_DIR, check=True)
+        except FileNotFoundError:
+            raise CommandError(f'Tailwind CLI not found: {settings.TAILWIND_CLI!r} (set TAILWIND_CLI)')
+        except subprocess.CalledProcessError as e:
+            raise CommandError(f'Tailwind build failed with exit code {e.returncode}')
+
+        digest = hashlib.sha256(build.read_bytes()).hexdigest()[:12]
+        output = css_dir / f'site.{digest}.css'
+        build.replace(output)
+        for old in css_dir.glob('site.*.css'):
+            if old != output:
+                old.unlink()
+        write_atomic(
+            generated_path(STYLESHEET_MANIFEST),
+            json.dumps({'file': f'css/{output.name}'}),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Built css/{output.name} ({output.stat().st_size // 1024} KB)'))
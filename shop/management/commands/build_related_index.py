@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.related import refresh_related_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the related-products index (run_jobs keeps it fresh incrementally)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true', help='Only refresh what changed')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = refresh_related_index(build=not options['incremental'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rewrote {count} related-product list(s) in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,21 @@
+from django.contrib.staticfiles.management.commands.collectstatic import Command as CollectStaticCommand
+from django.core.management import call_command
+
+from shop.theme import write_theme_css
+
+
+class Command(CollectStaticCommand):
+    """collectstatic that builds the stylesheet first, so it is always collected."""
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--skip-css', action='store_true',
+                            help='Collect without the Tailwind build; only theme.css is rewritten')
+
+    def handle(self, **options):
+        if options['skip_css']:
+            # The colours come from the database; the build is already in the image
+            write_theme_css()
+        else:
+            call_command('build_css', verbosity=options['verbosity'])
+        return super().handle(**options)
@@ -0,0 +1,51 @@
+import zipfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.catalogue import CatalogueError, RecordWriter, archive_images, catalogue_format, export_record
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Export the catalogue to CSV/JSONL, optionally with a zip of its images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='CSV or JSONL file to write')
+        parser.add_argument('--images', help='Also write the image files to this zip archive')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Default: from the file extension')
+        parser.add_argument('--active-only', action='store_true', help='Skip inactive products')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            fmt = catalogue_format(options['output'], options['format'])
+        except CatalogueError as e:
+            raise CommandError(e)
+
+        products = Product.objects.select_related('category').prefetch_related(
+            'images', 'content_images',
+        ).order_by('pk')
+        if options['active_only']:
+            products = products.filter(is_active=True)
+
+        # Images are already compressed: store them as they are
+        zf = zipfile.ZipFile(options['images'], 'w', zipfile.ZIP_STORED) if options['images'] else None
+        count, missing = 0, []
+        try:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                writer = RecordWriter(f, fmt)
+                for product in products.iterator(chunk_size=options['chunk_size']):
+                    record = export_record(product)
+                    writer.write(record)
+                    if zf is not None:
+                        missing += archive_images(
+                            zf, [record['image']] + record['gallery'] + record['content_images'],
+                        )
+                    count += 1
+        finally:
+            if zf is not None:
+                zf.close()
+
+        if missing:
+            self.stderr.write(f'{len(missing)} image file(s) missing from storage, e.g. {missing[:3]}')
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} product(s) to {options['output']}"))
@@ -0,0 +1,226 @@
+import os
+import posixpath
+import time
+from collections import Counter
+from itertools import groupby
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from shop.models import Job, MediaBlob
+from shop.renditions import delete_renditions, rendition_dir
+from shop.storage import blob_fields, is_blob
+
+FILE_CHUNK = 500
+RENDITIONS = 'renditions'
+
+
+def _mb(size):
+    return f'{size / 1024 / 1024:.1f} MB'
+
+
+def _walk(root, skip=()):
+    """Yield the DirEntry of every file under ``root``.
+
+    Only the directories still to visit are held, never a listing: files
+    come out as scandir() reads them, one directory at a time.
+    """
+    stack = [str(root)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path not in skip:
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+def _chunks(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _references(names):
+    """{name: rows referring to it} for ``names``, one grouped query per image field."""
+    counts = Counter()
+    for model, field in blob_fields():
+        rows = model.objects.filter(**{f'{field}__in': names}).order_by().values(field).annotate(
+            n=Count('pk'),
+        ).values_list(field, 'n')
+        for name, n in rows:
+            counts[name] += n
+    return counts
+
+
+class Command(BaseCommand):
+    help = 'Find uploaded files no row refers to any more, and delete them past a grace period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='Delete unreferenced files older than --grace')
+        parser.add_argument('--grace', type=float, default=24.0,
+                            help='Hours since a file was last written before it may go (default 24)')
+        parser.add_argument('--dry-run', action='store_true', help='With --delete, list the files instead')
+
+    def handle(self, *args, **options):
+        self.delete = options['delete'] and not options['dry_run']
+        self.listing = options['dry_run'] or options['verbosity'] > 1
+        # Uploads are stored before the row that refers to them is saved;
+        # the grace period keeps them out of reach meanwhile
+        self.cutoff = time.time() - options['grace'] * 3600
+        self.root = str(settings.MEDIA_ROOT)
+        self.stats = Counter()
+
+        renditions = os.path.join(self.root, RENDITIONS)
+        for batch in _chunks(_walk(self.root, skip={renditions}), FILE_CHUNK):
+            self.collect(batch)
+        for directory, entries in groupby(_walk(renditions), key=lambda e: os.path.dirname(e.path)):
+            self.collect_renditions(directory, list(entries))
+
+        s = self.stats
+        self.stdout.write(f"Scanned {s['files']} file(s), {_mb(s['bytes'])}")
+        self.stdout.write(
+            f"Unreferenced: {s['unreferenced']} file(s) and {s['orphan_sets']} orphaned rendition set(s), "
+            f"{_mb(s['reclaimable'])} reclaimable ({_mb(s['expired_bytes'])} past the grace period)"
+        )
+        if s['refcounts']:
+            self.stdout.write(f"Corrected the reference count of {s['refcounts']} blob(s)")
+        verb = 'Deleted' if self.delete else 'Would delete'
+        style = self.style.SUCCESS if self.delete else self.style.WARNING
+        if options['delete']:
+            self.stdout.write(style(f"{verb} {s['expired']} file(s) and rendition set(s), {_mb(s['expired_bytes'])}"))
+
+    def collect(self, entries):
+        files = {}
+        for entry in entries:
+            name = posixpath.join(*os.path.relpath(entry.path, self.root).split(os.sep))
+            stat = entry.stat(follow_symlinks=False)
+            files[name] = stat
+            self.stats['files'] += 1
+            self.stats['bytes'] += stat.st_size
+
+        references = _references(list(files))
+        if self.delete:
+            self.correct_refcounts({name: n for name, n in references.items() if is_blob(name)}, files)
+        expired = []
+        for name, stat in files.items():
+            if name in references:
+                continue
+            size = stat.st_size + self.renditions_size(name)
+            self.stats['unreferenced'] += 1
+            self.stats['reclaimable'] += size
+            if stat.st_mtime < self.cutoff:
+                expired.append((name, size))
+        if expired:
+            self.remove(expired)
+
+    def correct_refcounts(self, references, files):
+        """Bring MediaBlob back in line with the rows, for those gone without a release.
+
+        A count below the rows is raised. One above them is lowered only
+        when no files.delete job is still to release a reference and the
+        file is past the grace period: save() counts a reference before
+        the row holding it is saved, and a queued release drops one that
+        no row holds any more.
+        """
+        stale = [
+            name for name, refcount in MediaBlob.objects.filter(
+                name__in=list(references),
+            ).values_list('name', 'refcount')
+            if refcount != references[name]
+        ]
+        if not stale:
+            return
+        with transaction.atomic():
+            # Locked like release() and _save(), then counted again under the locks
+            blobs = dict(MediaBlob.objects.select_for_update().filter(
+                name__in=stale,
+            ).values_list('name', 'refcount'))
+            rows = _references(list(blobs))
+            releasing = Job.objects.filter(task='files.delete', status__in=('queued', 'running')).exists()
+            for name, refcount in blobs.items():
+                if rows[name] == refcount or not rows[name]:
+                    continue
+                if rows[name] < refcount and (releasing or files[name].st_mtime >= self.cutoff):
+                    continue
+                MediaBlob.objects.filter(name=name).update(refcount=rows[name])
+                self.stats['refcounts'] += 1
+
+    def renditions_size(self, name):
+        try:
+            _, files = default_storage.listdir(rendition_dir(name))
+        except FileNotFoundError:
+            return 0
+        return sum(default_storage.size(posixpath.join(rendition_dir(name), f)) for f in files)
+
+    def remove(self, expired):
+        if not self.delete:
+            for name, size in expired:
+                self.stats['expired'] += 1
+                self.stats['expired_bytes'] += size
+                if self.listing:
+                    self.stdout.write(f'  {name} ({_mb(size)})')
+            return
+        names = [name for name, _ in expired]
+        # The row locks order this against a save() of the same bytes, and
+        # the references are checked again under them
+        with transaction.atomic():
+            list(MediaBlob.objects.select_for_update().filter(name__in=names).values_list('pk'))
+            still = _references(names)
+            doomed = [(name, size) for name, size in expired if name not in still]
+            MediaBlob.objects.filter(name__in=[name for name, _ in doomed]).delete()
+            for name, size in doomed:
+                default_storage.delete(name)
+                delete_renditions(name, default_storage)
+                self.stats['expired'] += 1
+                self.stats['expired_bytes'] += size
+                if self.listing:
+                    self.stdout.write(f'  {name} ({_mb(size)})')
+
+    def collect_renditions(self, directory, entries):
+        """A rendition set is orphaned when its source file is gone."""
+        base = os.path.relpath(directory, os.path.join(self.root, RENDITIONS))
+        stats = [entry.stat(follow_symlinks=False) for entry in entries]
+        size = sum(stat.st_size for stat in stats)
+        self.stats['files'] += len(stats)
+        self.stats['bytes'] += size
+        source_dir, stem = os.path.split(os.path.join(self.root, base))
+        if self.has_source(source_dir, stem):
+            return
+        self.stats['orphan_sets'] += 1
+        self.stats['reclaimable'] += size
+        if max(stat.st_mtime for stat in stats) >= self.cutoff:
+            return
+        self.stats['expired'] += 1
+        self.stats['expired_bytes'] += size
+        name = posixpath.join(RENDITIONS, *base.split(os.sep))
+        if self.listing:
+            self.stdout.write(f'  {name}/ ({_mb(size)})')
+        if self.delete:
+            for entry in entries:
+                default_storage.delete(posixpath.join(name, entry.name))
+
+    def has_source(self, directory, stem):
+        # Rendition sets of one directory are walked together: list their
+        # sources' directory once
+        if getattr(self, '_listed', (None,))[0] != directory:
+            try:
+                with os.scandir(directory) as entries:
+                    stems = {os.path.splitext(e.name)[0] for e in entries if e.is_file(follow_symlinks=False)}
+            except FileNotFoundError:
+                stems = set()
+            self._listed = (directory, stems)
+        return stem in self._listed[1]
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import Product
+from shop.renditions import generate_renditions, rendition_models
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive image renditions for every uploaded image'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate existing renditions')
+
+    def handle(self, *args, **options):
+        generated = failed = 0
+        for model, field_name in rendition_models():
+            qs = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for obj in qs.only('pk', field_name).iterator(chunk_size=500):
+                fieldfile = getattr(obj, field_name)
+                try:
+                    generate_renditions(fieldfile, force=options['force'])
+                    generated += 1
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'{model._meta.label} #{obj.pk} ({fieldfile.name}): {exc}')
+        # Content images are inlined into precompiled HTML, so refresh it
+        for product in Product.objects.filter(content_images__isnull=False).distinct().iterator():
+            product.recompile_content()
+        self.stdout.write(self.style.SUCCESS(f'Renditions ready for {generated} images ({failed} failed)'))
@@ -0,0 +1,107 @@
+import hashlib
+import json
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from shop.cache import HOME_PAGE, bump_version
+from shop.jobs import enqueue
+from shop.catalogue import (
+    CatalogueError, ImageArchive, catalogue_format, import_batch, parse_record, read_records,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Import products from a CSV/JSONL catalogue (and a zip of its images) in '
+        'checkpointed batches; an interrupted import resumes where it stopped'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('catalogue', help='CSV or JSONL file')
+        parser.add_argument('--images', help='Zip archive holding the image files the records name')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Default: from the file extension')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--journal-author', metavar='USERNAME',
+                            help='Also create a journal post per product, by this user')
+        parser.add_argument('--restart', action='store_true', help='Ignore an earlier checkpoint')
+
+    def handle(self, *args, **options):
+        source = Path(options['catalogue'])
+        if not source.is_file():
+            raise CommandError(f'No such file: {source}')
+        try:
+            fmt = catalogue_format(source, options['format'])
+        except CatalogueError as e:
+            raise CommandError(e)
+        author = None
+        if options['journal_author']:
+            author = get_user_model().objects.filter(username=options['journal_author']).first()
+            if author is None:
+                raise CommandError(f"No such user: {options['journal_author']}")
+
+        checkpoint_path = self.checkpoint_path(source)
+        state = {'records': 0, 'created': 0, 'skipped': 0, 'errors': 0, 'finished': False}
+        if checkpoint_path.exists() and not options['restart']:
+            state = json.loads(checkpoint_path.read_text())
+            if state['finished']:
+                self.stdout.write(f'{source} was already imported (use --restart to import it again)')
+                return
+            self.stdout.write(f"Resuming after record {state['records']}")
+
+        archive = ImageArchive(options['images'])
+        categories = {}
+        try:
+            with open(source, newline='', encoding='utf-8-sig') as f:
+                records = islice(read_records(f, fmt), state['records'], None)
+                while True:
+                    raw_batch = list(islice(records, options['batch_size']))
+                    if not raw_batch:
+                        break
+                    batch = []
+                    for line, raw in raw_batch:
+                        try:
+                            batch.append(parse_record(raw))
+                        except CatalogueError as e:
+                            state['errors'] += 1
+                            self.stderr.write(f'{source}:{line}: {e}')
+                    with transaction.atomic():
+                        created, skipped = import_batch(batch, archive, categories, author) if batch else ([], 0)
+                    state['records'] += len(raw_batch)
+                    state['created'] += len(created)
+                    state['skipped'] += skipped
+                    self.save_checkpoint(checkpoint_path, state)
+                    self.stdout.write(
+                        f"{state['records']} records: {state['created']} created, "
+                        f"{state['skipped']} already present, {state['errors']} invalid"
+                    )
+        finally:
+            archive.close()
+
+        state['finished'] = True
+        self.save_checkpoint(checkpoint_path, state)
+        bump_version(HOME_PAGE)
+        enqueue('related.refresh', key='related:refresh')
+        enqueue('sitemaps.publish', key='sitemaps:publish')
+        if archive.missing:
+            self.stderr.write(
+                f'{len(archive.missing)} image(s) not found in the archive, e.g. {archive.missing[:3]}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {state['created']} product(s); renditions and related products are queued for run_jobs"
+        ))
+
+    def checkpoint_path(self, source):
+        stat = source.stat()
+        key = hashlib.sha1(f'{source.resolve()}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()[:16]
+        return Path(settings.STATE_DIR) / 'imports' / f'{key}.json'
+
+    def save_checkpoint(self, path, state):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(state))
+        tmp.replace(path)
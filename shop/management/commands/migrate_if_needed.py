@@ -0,0 +1,58 @@
+import pkgutil
+import time
+from importlib import import_module
+
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+
+
+def disk_migrations():
+    """{(app label, name)} of every migration file, found without importing them."""
+    found = set()
+    for app_config in apps.get_app_configs():
+        module_name, _ = MigrationLoader.migrations_module(app_config.label)
+        if module_name is None:
+            continue
+        try:
+            module = import_module(module_name)
+        except ModuleNotFoundError:
+            continue
+        for _, name, is_pkg in pkgutil.iter_modules(getattr(module, '__path__', [])):
+            if not is_pkg and name[0] not in '_~':
+                found.add((app_config.label, name))
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        'Run migrate only when the database is missing a migration: compare the migration '
+        'files with the applied migrations (one query)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        database = options['database']
+        on_disk = disk_migrations()
+        recorder = MigrationRecorder(connections[database])
+        applied = set(recorder.applied_migrations()) if recorder.has_table() else set()
+
+        # Rows of migrations since deleted (squashed away) don't count
+        if on_disk <= applied:
+            self.stdout.write(self.style.SUCCESS(
+                f'Schema is current ({len(on_disk)} migrations applied); '
+                f'skipped migrate in {time.perf_counter() - started:.2f}s'
+            ))
+            return
+
+        missing = sorted(on_disk - applied)
+        self.stdout.write(f'{len(missing)} migration(s) to apply: ' + ', '.join(
+            f'{app}.{name}' for app, name in missing[:10]
+        ) + (' ...' if len(missing) > 10 else ''))
+        call_command('migrate', database=database, interactive=False, verbosity=options['verbosity'])
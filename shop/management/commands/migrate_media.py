@@ -0,0 +1,96 @@
+import hashlib
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from shop.cache import HOME_PAGE, SITE_CHROME, bump_version
+from shop.models import Product
+from shop.renditions import move_renditions
+from shop.storage import BLOB_DIR, blob_fields, blob_storage
+
+ROW_CHUNK = 500
+
+
+def _mb(size):
+    return f'{size / 1024 / 1024:.1f} MB'
+
+
+class Command(BaseCommand):
+    help = 'Move uploads stored before content-addressed storage into it, merging identical files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be merged, change nothing')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.moved = {}    # old name -> blob name (or digest, in a dry run)
+        self.sizes = {}    # blob name or digest -> size
+        self.before = 0
+        self.missing = 0
+        rows = 0
+        for model, field in blob_fields():
+            rows += self.migrate_field(model, field)
+
+        if not self.dry_run and self.moved:
+            for old in self.moved:
+                default_storage.delete(old)
+            # Content image URLs are compiled into product and post HTML
+            for product in Product.objects.filter(content_images__isnull=False).distinct().iterator():
+                product.recompile_content()
+            bump_version(HOME_PAGE)
+            bump_version(SITE_CHROME)  # every page's ETag
+
+        after = sum(self.sizes.values())
+        verb = 'Would move' if self.dry_run else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(self.moved)} file(s) ({_mb(self.before)}) for {rows} row(s) into '
+            f'{len(self.sizes)} blob(s) ({_mb(after)}), freeing {_mb(self.before - after)}'
+        ))
+        if self.missing:
+            self.stdout.write(self.style.WARNING(f'{self.missing} referenced file(s) are missing'))
+
+    def migrate_field(self, model, field):
+        # Batches by pk rather than one cursor: the rows change under it
+        queryset = model.objects.exclude(**{f'{field}__startswith': BLOB_DIR + '/'}).exclude(
+            **{field: ''},
+        ).exclude(**{f'{field}__isnull': True}).order_by('pk')
+        last_pk, count = 0, 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).values_list('pk', field)[:ROW_CHUNK])
+            if not batch:
+                return count
+            for pk, name in batch:
+                new = self.store(name)
+                if new is not None and not self.dry_run:
+                    model.objects.filter(pk=pk).update(**{field: new})
+                count += new is not None
+            last_pk = batch[-1][0]
+
+    def store(self, name):
+        """The blob name for ``name``, storing it on first sight; None if the file is missing."""
+        new = self.moved.get(name)
+        if new is not None:
+            if not self.dry_run:
+                blob_storage().retain(new)
+            return new
+        try:
+            source = default_storage.open(name)
+        except FileNotFoundError:
+            self.missing += 1
+            self.stderr.write(f'  missing: {name}')
+            return None
+        with source:
+            size = source.size
+            self.before += size
+            if self.dry_run:
+                digest = hashlib.sha256()
+                for chunk in source.chunks():
+                    digest.update(chunk)
+                new = digest.hexdigest()
+            else:
+                new = blob_storage().save(name, File(source, name=name))
+                move_renditions(name, new, default_storage)
+        self.moved[name] = new
+        self.sizes[new] = size
+        return new
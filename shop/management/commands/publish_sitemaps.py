@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.jobs import enqueue
+from shop.sitemaps import is_published, publish_feeds, publish_sitemaps
+
+
+class Command(BaseCommand):
+    help = 'Write sitemap.xml, its shards and the Atom feeds to STATIC_ROOT (run_jobs keeps them fresh)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rewrite every shard, changed or not')
+        parser.add_argument('--if-missing', action='store_true',
+                            help='Write them now only if they are missing; otherwise queue a refresh for run_jobs')
+
+    def handle(self, *args, **options):
+        if options['if_missing'] and is_published():
+            enqueue('sitemaps.publish', key='sitemaps:publish', full=options['full'])
+            self.stdout.write('Sitemaps and feeds are on disk; queued a refresh')
+            return
+        started = time.perf_counter()
+        written = publish_sitemaps(full=options['full']) + publish_feeds()
+        for name in written:
+            self.stdout.write(f'  {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {len(written)} file(s) in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,47 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from shop.jobs import prune_done, requeue_stale, run_next
+
+PRUNE_EVERY = 3600  # seconds
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (image processing, file cleanup, ...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds to wait when idle')
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale job(s)')
+        self.stdout.write('Job worker started')
+
+        pruned_at = None
+        while self.running:
+            close_old_connections()
+            if pruned_at is None or time.monotonic() - pruned_at >= PRUNE_EVERY:
+                pruned_at = time.monotonic()
+                pruned = prune_done()
+                if pruned:
+                    self.stdout.write(f'Deleted {pruned} finished job(s)')
+            job = run_next()
+            if job:
+                self.stdout.write(f'{job.task} #{job.pk}: {job.status}')
+                continue
+            if options['burst']:
+                break
+            time.sleep(options['poll'])
+        close_old_connections()
+
+    def stop(self, signum, frame):
+        self.running = False
@@ -0,0 +1,96 @@
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Modules the web process should not load until a request needs them
+HEAVY_MODULES = ('PIL', 'numpy')
+
+# Run in a fresh interpreter under -X importtime: the startup of one
+# worker, in phases
+PROBE = '''
+import os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'atelier.settings')
+marks = [('start', time.perf_counter())]
+import django
+marks.append(('import django', time.perf_counter()))
+django.setup()
+marks.append(('django.setup() (settings, apps, models)', time.perf_counter()))
+from django.conf import settings
+from importlib import import_module
+import_module(settings.ROOT_URLCONF)
+marks.append(('URLconf and views', time.perf_counter()))
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+marks.append(('WSGI handler and middleware', time.perf_counter()))
+for (_, before), (phase, after) in zip(marks, marks[1:]):
+    print(f'{phase}\\t{(after - before) * 1000:.1f}')
+'''
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = 'Time a fresh worker start, phase by phase, and show where the import time goes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='How many modules and packages to list')
+
+    def handle(self, *args, **options):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE], cwd=settings.BASE_DIR,
+            capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f'The probe failed:\n{result.stderr[-2000:]}')
+
+        self.stdout.write('Phases:')
+        total = 0.0
+        for line in result.stdout.splitlines():
+            phase, ms = line.split('\t')
+            total += float(ms)
+            self.stdout.write(f'  {phase:<42} {float(ms):>8.1f}ms')
+        self.stdout.write(f"  {'total':<42} {total:>8.1f}ms")
+
+        modules = []   # (name, self µs, cumulative µs, importer)
+        ancestors = []
+        # importtime prints a module after those it imports, one level
+        # deeper: read backwards, each module's importer comes first
+        for line in reversed(result.stderr.splitlines()):
+            match = IMPORT_LINE.match(line)
+            if not match:
+                continue
+            own, cumulative, indent, name = match.groups()
+            depth = len(indent)
+            while ancestors and ancestors[-1][0] >= depth:
+                ancestors.pop()
+            modules.append((name, int(own), int(cumulative), ancestors[-1][1] if ancestors else None))
+            ancestors.append((depth, name))
+
+        packages = defaultdict(int)
+        for name, own, _, _ in modules:
+            packages[name.split('.')[0]] += own
+        imported = sum(packages.values())
+        self.stdout.write(f'\nImport time by top-level package ({imported / 1000:.1f}ms in all):')
+        for package, own in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {package:<32} {own / 1000:>8.1f}ms  {own / imported:>4.0%}')
+
+        apps = {'atelier', 'shop', 'blog', 'accounts'}
+        self.stdout.write('\nSlowest project modules (including what they import):')
+        ours = sorted((m for m in modules if m[0].split('.')[0] in apps), key=lambda m: -m[2])
+        for name, own, cumulative, _ in ours[:options['top']]:
+            self.stdout.write(f'  {name:<32} {cumulative / 1000:>8.1f}ms  (own {own / 1000:.1f}ms)')
+
+        heavy = [m for m in modules if m[0] in HEAVY_MODULES]
+        if heavy:
+            for name, _, cumulative, importer in heavy:
+                self.stdout.write(self.style.WARNING(
+                    f'\n{name} is imported at startup ({cumulative / 1000:.1f}ms), by {importer or "?"}'
+                ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"\nNone of {', '.join(HEAVY_MODULES)} is imported at startup"
+            ))
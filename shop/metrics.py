@@ -0,0 +1,325 @@
+"""Request metrics, summed over every worker, in Prometheus text format.
+
+MetricsMiddleware records, per URL name, the requests by method and
+status class, a latency histogram, the queries sent and the bytes
+returned. Views note cache lookups with cache_lookup(). Each worker
+keeps its totals in memory and writes them whole to its own file under
+STATE_DIR/metrics every METRICS_FLUSH_SECONDS (and when it exits):
+
+    metrics/<host>-<pid>-<start>.json
+
+exposition() adds up those files. The files of workers that have since
+exited are folded into archive.json first, so totals survive restarts
+and deploys and only ever grow, as Prometheus counters should. Database
+pool figures come from the live workers only.
+"""
+import atexit
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; compaction is then skipped
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ARCHIVE = 'archive.json'
+UNMATCHED = '<unmatched>'
+# request.META key of requests not to count, e.g. a worker's warm-up.
+# Headers arrive as HTTP_* keys, so no client can set it.
+UNRECORDED = 'atelier.unrecorded'
+POOL_GAUGES = ('max_size', 'idle', 'in_use', 'wait_seconds_max')
+
+
+def _empty():
+    return {
+        'requests': defaultdict(int),     # 'view|method|2xx' -> n
+        'latency': {},                    # view -> {'buckets': [...], 'sum': s, 'count': n}
+        'queries': defaultdict(int),      # view -> total queries
+        'bytes': defaultdict(int),        # view -> total response bytes
+        'cache': defaultdict(int),        # 'cache|hit' / 'cache|miss' -> n
+    }
+
+
+class _Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Held while a snapshot is taken and written, so an older one never
+        # lands after a newer one
+        self.write_lock = threading.Lock()
+        self.pid = None
+
+    def _ensure(self):
+        # Forked workers start from nothing, under a name of their own
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.name = f'{socket.gethostname()}-{self.pid}-{time.time_ns()}.json'
+            self.data = _empty()
+            self.flushed = time.monotonic()
+
+    def request(self, view, method, status, seconds, queries, size):
+        with self.lock:
+            self._ensure()
+            data = self.data
+            data['requests'][f'{view}|{method}|{status // 100}xx'] += 1
+            latency = data['latency'].setdefault(view, {
+                'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0,
+            })
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    latency['buckets'][i] += 1
+                    break
+            latency['sum'] += seconds
+            latency['count'] += 1
+            data['queries'][view] += queries
+            data['bytes'][view] += size
+        self.maybe_flush()
+
+    def cache(self, name, hit):
+        with self.lock:
+            self._ensure()
+            self.data['cache'][f"{name}|{'hit' if hit else 'miss'}"] += 1
+
+    def maybe_flush(self):
+        with self.lock:
+            due = time.monotonic() - self.flushed >= getattr(settings, 'METRICS_FLUSH_SECONDS', 5)
+            if due:
+                # Claimed here: the other threads' requests don't flush too
+                self.flushed = time.monotonic()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write this worker's totals; an I/O error is logged, never raised into a request."""
+        from atelier.db_pool.pool import pool_stats
+
+        with self.write_lock:
+            with self.lock:
+                if self.pid != os.getpid():
+                    return
+                self.flushed = time.monotonic()
+                snapshot = json.dumps({**self.data, 'pool': pool_stats()})
+            try:
+                _write(metrics_dir() / self.name, snapshot)
+            except OSError:
+                logger.exception('Could not write the request metrics of this worker')
+
+
+_recorder = _Recorder()
+atexit.register(_recorder.flush)
+
+
+def metrics_dir():
+    return Path(settings.STATE_DIR) / 'metrics'
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def cache_lookup(request, name, hit):
+    """Count a lookup in the cache ``name`` made for ``request``, for its hit rate."""
+    if not request.META.get(UNRECORDED):
+        _recorder.cache(name, hit)
+
+
+# ── Aggregation ──
+
+def _merge(total, data):
+    for key in ('requests', 'queries', 'bytes', 'cache'):
+        for name, value in data.get(key, {}).items():
+            total[key][name] += value
+    for view, latency in data.get('latency', {}).items():
+        into = total['latency'].setdefault(view, {
+            'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0,
+        })
+        into['buckets'] = [a + b for a, b in zip(into['buckets'], latency['buckets'])]
+        into['sum'] += latency['sum']
+        into['count'] += latency['count']
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(name):
+    host, pid, _ = name[:-len('.json')].rsplit('-', 2)
+    if host != socket.gethostname():
+        return True  # another container's worker: not ours to judge
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        pass
+    return True
+
+
+def _archive_exited(directory):
+    """Fold the files of exited workers into the archive, under a lock."""
+    if fcntl is None:
+        return
+    with open(directory / '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        exited = [p for p in directory.glob('*-*-*.json') if not _alive(p.name)]
+        if not exited:
+            return
+        archive = _empty()
+        _merge(archive, _read(directory / ARCHIVE) or {})
+        for path in exited:
+            _merge(archive, _read(path) or {})
+        _write(directory / ARCHIVE, json.dumps(archive))
+        for path in exited:
+            path.unlink(missing_ok=True)
+
+
+def collect():
+    """(totals over all workers, past and present, {pool key: summed pool stats} of live ones)."""
+    _recorder.flush()
+    directory = metrics_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    _archive_exited(directory)
+    total, pools = _empty(), defaultdict(lambda: defaultdict(float))
+    _merge(total, _read(directory / ARCHIVE) or {})
+    for path in directory.glob('*-*-*.json'):
+        data = _read(path)
+        if data is None:
+            continue
+        _merge(total, data)
+        for key, stats in data.get('pool', {}).items():
+            for stat, value in stats.items():
+                if stat == 'wait_seconds_max':
+                    pools[key][stat] = max(pools[key][stat], value)
+                else:
+                    pools[key][stat] += value
+    return total, pools
+
+
+# ── Exposition ──
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_label(value)}"' for key, value in labels.items()) + '}'
+
+
+def exposition():
+    """Every metric, in the Prometheus text format (version 0.0.4)."""
+    total, pools = collect()
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    family('atelier_http_requests_total', 'counter', 'Requests by URL name, method and status class.')
+    for key, n in sorted(total['requests'].items()):
+        view, method, status = key.split('|')
+        lines.append(f'atelier_http_requests_total{_labels(view=view, method=method, status=status)} {n}')
+
+    family('atelier_http_request_duration_seconds', 'histogram', 'Time spent in Django per request.')
+    for view, latency in sorted(total['latency'].items()):
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS, latency['buckets']):
+            cumulative += n
+            lines.append(f'atelier_http_request_duration_seconds_bucket{_labels(view=view, le=bound)} {cumulative}')
+        lines.append(
+            f'atelier_http_request_duration_seconds_bucket{_labels(view=view, le="+Inf")} {latency["count"]}'
+        )
+        lines.append(f'atelier_http_request_duration_seconds_sum{_labels(view=view)} {latency["sum"]:.6f}')
+        lines.append(f'atelier_http_request_duration_seconds_count{_labels(view=view)} {latency["count"]}')
+
+    family('atelier_db_queries_total', 'counter', 'Database queries sent, by URL name.')
+    for view, n in sorted(total['queries'].items()):
+        lines.append(f'atelier_db_queries_total{_labels(view=view)} {n}')
+
+    family('atelier_http_response_bytes_total', 'counter', 'Response body bytes, by URL name.')
+    for view, n in sorted(total['bytes'].items()):
+        lines.append(f'atelier_http_response_bytes_total{_labels(view=view)} {n}')
+
+    family('atelier_cache_lookups_total', 'counter', 'Cache lookups by cache and result (hit or miss).')
+    for key, n in sorted(total['cache'].items()):
+        cache, result = key.split('|')
+        lines.append(f'atelier_cache_lookups_total{_labels(cache=cache, result=result)} {n}')
+
+    for stat in sorted({stat for stats in pools.values() for stat in stats}):
+        name = f'atelier_db_pool_{stat}'
+        gauge = stat in POOL_GAUGES
+        if not gauge and not stat.endswith('_total'):
+            name += '_total'
+        family(name, 'gauge' if gauge else 'counter', f'Database pool {stat.replace("_", " ")}, live workers.')
+        for key, stats in sorted(pools.items()):
+            if stat in stats:
+                lines.append(f'{name}{_labels(pool=key)} {stats[stat]:g}')
+    return '\n'.join(lines) + '\n'
+
+
+# ── Middleware ──
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name if match else None) or UNMATCHED
+
+
+def _method(request):
+    return request.method if request.method in ('GET', 'HEAD', 'POST') else 'other'
+
+
+class MetricsMiddleware:
+    """Outermost, so the time covers the whole middleware stack."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, seconds):
+        if request.META.get(UNRECORDED):
+            return
+        counter = getattr(request, 'query_counter', None)
+        size = 0 if response.streaming else len(response.content)
+        _recorder.request(
+            _view_name(request), _method(request), response.status_code, seconds,
+            counter.count if counter else 0, size,
+        )
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:15
+
+from django.db import migrations, models
+from django.utils.html import linebreaks
+
+from shop.content import content_image_map, render_rich_content, source_hash
+
+
+def compile_existing(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ContentImage = apps.get_model('shop', 'ContentImage')
+    Page = apps.get_model('shop', 'Page')
+    for product in Product.objects.all():
+        image_map = content_image_map(ContentImage.objects.filter(product_id=product.pk))
+        Product.objects.filter(pk=product.pk).update(
+            description_html=render_rich_content(product.description, image_map),
+            description_hash=source_hash(product.description, image_map),
+        )
+    for page in Page.objects.all():
+        Page.objects.filter(pk=page.pk).update(
+            content_html=linebreaks(page.content, autoescape=True),
+            content_hash=source_hash(page.content),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_page_alter_menuitem_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='description_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='description_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(compile_existing, migrations.RunPython.noop),
+    ]
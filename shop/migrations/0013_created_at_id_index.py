@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='shop_produc_created_467304_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:26
+
+from django.db import migrations, models
+from django.urls import reverse
+
+from shop.search import install_search_index, search_text, uninstall_search_index
+
+
+def create_search_index(apps, schema_editor):
+    install_search_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    uninstall_search_index(schema_editor.connection)
+
+
+def index_existing(apps, schema_editor):
+    SearchEntry = apps.get_model('shop', 'SearchEntry')
+    entries = [
+        SearchEntry(kind='product', object_id=p.pk, title=p.name, body=search_text(p.description),
+                    url=reverse('product_detail', args=[p.slug]), is_public=p.is_active)
+        for p in apps.get_model('shop', 'Product').objects.all()
+    ] + [
+        SearchEntry(kind='post', object_id=p.pk, title=p.title, body=search_text(p.content),
+                    url=reverse('post_detail', args=[p.slug]))
+        for p in apps.get_model('blog', 'Post').objects.all()
+    ] + [
+        SearchEntry(kind='page', object_id=p.pk, title=p.title, body=p.content,
+                    url=f'/{p.slug}/', is_public=p.is_active)
+        for p in apps.get_model('shop', 'Page').objects.all()
+    ]
+    SearchEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_created_at_id_index'),
+        ('blog', '0003_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('product', 'Product'), ('post', 'Post'), ('page', 'Page')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('body', models.TextField(blank=True)),
+                ('url', models.CharField(max_length=300)),
+                ('is_public', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'search entries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_entry'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
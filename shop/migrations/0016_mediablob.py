@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:46
+
+from django.db import migrations, models
+import shop.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_relatedproduct'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('refcount', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='contentimage',
+            name='image',
+            field=models.ImageField(storage=shop.storage.blob_storage, upload_to='products/content/'),
+        ),
+        migrations.AlterField(
+            model_name='herobanner',
+            name='image',
+            field=models.ImageField(storage=shop.storage.blob_storage, upload_to='banners/'),
+        ),
+        migrations.AlterField(
+            model_name='popup',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=shop.storage.blob_storage, upload_to='popups/'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=shop.storage.blob_storage, upload_to='products/'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=shop.storage.blob_storage, upload_to='products/gallery/'),
+        ),
+    ]
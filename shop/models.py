@@ -1,4 +1,9 @@
 from django.db import models
+from django.utils import timezone
+from django.utils.html import linebreaks
+
+from .content import content_image_map, render_rich_content, source_hash
+from .storage import blob_storage
 
 
 class Category(models.Model):
@@ -20,7 +25,9 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField()
-    image = models.ImageField(upload_to='products/', blank=True, null=True)
+    description_html = models.TextField(blank=True, editable=False)
+    description_hash = models.CharField(max_length=64, blank=True, editable=False)
+    image = models.ImageField(upload_to='products/', storage=blob_storage, blank=True, null=True)
     stock = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
@@ -29,14 +36,53 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['created_at', 'id'])]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.compile_description()
+        super().save(*args, **kwargs)
+
+    def content_image_map(self):
+        if self.pk is None:
+            return {}
+        return content_image_map(self.content_images.all())
+
+    def compile_description(self, image_map=None):
+        """Refresh description_html if the text or its images changed."""
+        if image_map is None:
+            image_map = self.content_image_map()
+        digest = source_hash(self.description, image_map)
+        if digest == self.description_hash:
+            return False
+        self.description_html = render_rich_content(self.description, image_map)
+        self.description_hash = digest
+        return True
+
+    def recompile_content(self):
+        """Recompile this product's and its journal posts' HTML after an image change."""
+        image_map = self.content_image_map()
+        if self.compile_description(image_map):
+            # updated_at is the page's Last-Modified
+            Product.objects.filter(pk=self.pk).update(
+                description_html=self.description_html,
+                description_hash=self.description_hash,
+                updated_at=timezone.now(),
+            )
+        for post in self.post_set.all():
+            if post.compile_content(image_map):
+                type(post).objects.filter(pk=post.pk).update(
+                    content_html=post.content_html,
+                    content_hash=post.content_hash,
+                    updated_at=timezone.now(),
+                )
+
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='products/gallery/')
+    image = models.ImageField(upload_to='products/gallery/', storage=blob_storage)
     order = models.PositiveIntegerField(default=0)
 
     class Meta:
@@ -48,7 +94,7 @@ class ProductImage(models.Model):
 
 class ContentImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='content_images')
-    image = models.ImageField(upload_to='products/content/')
+    image = models.ImageField(upload_to='products/content/', storage=blob_storage)
     number = models.PositiveIntegerField(default=1)
 
     class Meta:
@@ -61,7 +107,7 @@ class ContentImage(models.Model):
 class HeroBanner(models.Model):
     title = models.CharField(max_length=200, blank=True)
     subtitle = models.TextField(blank=True)
-    image = models.ImageField(upload_to='banners/')
+    image = models.ImageField(upload_to='banners/', storage=blob_storage)
     crop_x = models.FloatField(default=0)
     crop_y = models.FloatField(default=0)
     crop_width = models.FloatField(default=0)
@@ -88,7 +134,7 @@ class Popup(models.Model):
 
     title = models.CharField(max_length=200)
     content = models.TextField(blank=True)
-    image = models.ImageField(upload_to='popups/', blank=True, null=True)
+    image = models.ImageField(upload_to='popups/', storage=blob_storage, blank=True, null=True)
     popup_type = models.CharField(max_length=20, choices=POPUP_TYPE_CHOICES, default='announcement')
     is_active = models.BooleanField(default=True)
     link_url = models.URLField(blank=True)
@@ -128,6 +174,8 @@ class Page(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     content = models.TextField(blank=True)
+    content_html = models.TextField(blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -138,6 +186,13 @@ class Page(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        digest = source_hash(self.content)
+        if digest != self.content_hash:
+            self.content_html = linebreaks(self.content, autoescape=True)
+            self.content_hash = digest
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return f'/{self.slug}/'
 
@@ -166,3 +221,90 @@ class SiteSetting(models.Model):
 
     def __str__(self):
         return 'Site Settings'
+
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    key = models.CharField(max_length=200, blank=True, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return f'{self.task} #{self.pk} ({self.status})'
+
+    @property
+    def error_summary(self):
+        lines = [line for line in self.last_error.splitlines() if line.strip()]
+        return lines[-1] if lines else ''
+
+
+class SearchEntry(models.Model):
+    """Plain-text copy of a searchable object, indexed by shop.search."""
+    KIND_CHOICES = [
+        ('product', 'Product'),
+        ('post', 'Post'),
+        ('page', 'Page'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    url = models.CharField(max_length=300)
+    is_public = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'search entries'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_entry'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind}: {self.title}'
+
+
+class RelatedProduct(models.Model):
+    """A precomputed neighbour of a product, built by shop.related."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_related_rank'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} -> {self.related_id} ({self.score:.3f})'
+
+
+class MediaBlob(models.Model):
+    """A file in content-addressed storage and how many fields refer to it."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
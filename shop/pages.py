@@ -0,0 +1,43 @@
+"""Per-worker registry of active Pages for the catch-all ``/<slug>/`` route.
+
+Every unmatched single-segment URL lands on page_detail, including the
+crawlers probing for /wp-login/ and friends. The registry holds every
+active Page (pages are few and small), so known slugs render without a
+query and unknown ones 404 without opening a database connection. It is
+reloaded when the PAGES version stamp moves, which any Page save or
+delete bumps.
+"""
+from dataclasses import dataclass
+
+from .cache import PAGES, get_version
+
+
+@dataclass(frozen=True)
+class PageRegistry:
+    version: int
+    pages: dict
+
+
+_registry = None
+
+
+def _build_page_registry(version):
+    from .models import Page
+
+    pages = Page.objects.filter(is_active=True).defer('content', 'content_hash')
+    return PageRegistry(version=version, pages={page.slug: page for page in pages})
+
+
+def get_page_registry():
+    """Active pages by slug, loaded once per worker until invalidated."""
+    global _registry
+    version = get_version(PAGES)
+    registry = _registry
+    if registry is None or registry.version != version:
+        registry = _registry = _build_page_registry(version)
+    return registry
+
+
+def get_page(slug):
+    """The active Page at ``slug``, or None. Treat it as read-only: it is shared."""
+    return get_page_registry().pages.get(slug)
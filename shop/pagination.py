@@ -0,0 +1,51 @@
+"""Keyset (cursor) pagination on (created_at, id), newest first.
+
+Unlike OFFSET pagination the cost of a page does not grow with its
+depth: each slice is one indexed range scan starting after the last
+row of the previous slice.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+PAGE_SIZE = 24
+
+
+def encode_cursor(obj):
+    raw = f'{obj.created_at.isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, pk) from a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(queryset, cursor=None, size=PAGE_SIZE):
+    """Return (items, next_cursor) for the slice after ``cursor``.
+
+    ``next_cursor`` is None on the last slice.
+    """
+    queryset = queryset.order_by('-created_at', '-pk')
+    key = decode_cursor(cursor)
+    if key:
+        created_at, pk = key
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    items = list(queryset[:size + 1])
+    next_cursor = encode_cursor(items[size - 1]) if len(items) > size else None
+    return items[:size], next_cursor
+
+
+def cursor_url(request, path, cursor):
+    """``path`` with the current query string, pointing at ``cursor``."""
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f'{path}?{params.urlencode()}'
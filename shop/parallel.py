@@ -0,0 +1,66 @@
+"""Independent queries of an async view, run at the same time.
+
+Django's ORM is synchronous: from an async view each query goes through
+sync_to_async. gather_queries() runs a batch of them on a small pool of
+query threads (QUERY_THREADS per process), so a page waits for its
+slowest query instead of the sum of them all. Each thread hands its
+connection back (to the pool, with CONN_MAX_AGE = 0) once its query is
+done, so idle query threads never sit on a connection.
+
+Query threads have connections of their own, outside the request's
+transaction. So the batch runs one query after another, on the request's
+own thread, whenever that thread is inside atomic() (as under TestCase)
+or the request did not come through ASGI: under WSGI the view has no
+event loop to overlap the queries on anyway.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, connection
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _query_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'QUERY_THREADS', 4), thread_name_prefix='query',
+                )
+    return _executor
+
+
+def _run_query(func):
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+def _in_atomic_block():
+    return connection.in_atomic_block
+
+
+def _run_in_turn(funcs):
+    return [func() for func in funcs]
+
+
+async def gather_queries(request, *funcs):
+    """Call each of ``funcs`` for ``request``, concurrently if it may; their results, in order.
+
+    Each must do all its database work itself: return a list, not a lazy
+    queryset that the template would evaluate later on another thread.
+    """
+    if not isinstance(request, ASGIRequest) or await sync_to_async(_in_atomic_block)():
+        return await sync_to_async(_run_in_turn)(funcs)
+    executor = _query_executor()
+    return await asyncio.gather(*(
+        sync_to_async(_run_query, thread_sensitive=False, executor=executor)(func) for func in funcs
+    ))
@@ -0,0 +1,131 @@
+"""Per-request query counting and per-view query budgets.
+
+Views declare the most queries they may send with ``@query_budget(n)``.
+QueryBudgetMiddleware counts every query (and repeated SQL, the usual
+N+1 signature) while the request runs:
+
+- with QUERY_BUDGET_HEADERS on (the default when DEBUG), the counts are
+  returned in X-Query-Count / X-Query-Duplicates response headers;
+- going over budget logs a warning, or raises QueryBudgetExceeded when
+  QUERY_BUDGET_STRICT is on, which is how test runs fail on regressions.
+
+The request's counter lives in a context variable, and every connection
+reports to whichever counter its thread's context holds. Async views run
+their queries on other threads (sync_to_async copies the context there),
+and those are counted too.
+"""
+import logging
+import threading
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries):
+    """Declare the most queries a view may send, whatever the data size."""
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+            self.statements[sql] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def duplicates(self):
+        return sum(n - 1 for n in self.statements.values() if n > 1)
+
+
+_current_counter = ContextVar('query_counter', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = _current_counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    return counter(execute, sql, params, many, context)
+
+
+def _install(connection, **kwargs):
+    # First in line: connection.execute_wrapper() pops the last wrapper,
+    # which may have been pushed before this one
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _count_query)
+
+
+connection_created.connect(_install, dispatch_uid='shop.querybudget')
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # This thread's connection may predate the connection_created receiver
+        _install(connection)
+        counter, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_counter.reset(token)
+        return self.finish(request, counter, response)
+
+    async def __acall__(self, request):
+        counter, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_counter.reset(token)
+        return self.finish(request, counter, response)
+
+    def start(self, request):
+        counter = QueryCounter()
+        request.query_counter = counter
+        return counter, _current_counter.set(counter)
+
+    def finish(self, request, counter, response):
+        if getattr(settings, 'QUERY_BUDGET_HEADERS', settings.DEBUG):
+            response['X-Query-Count'] = str(counter.count)
+            response['X-Query-Duplicates'] = str(counter.duplicates)
+
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None and counter.count > budget:
+            repeated = [sql for sql, n in counter.statements.most_common(3) if n > 1]
+            message = (
+                f'{request.path} sent {counter.count} queries (budget {budget}, '
+                f'{counter.duplicates} duplicates). Most repeated: {repeated}'
+            )
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, 'query_budget', None)
@@ -0,0 +1,174 @@
+"""Content-based related products.
+
+Every active product is a TF-IDF vector over the words of its name
+(counted NAME_WEIGHT times) and description, plus a one-hot block for its
+category, L2-normalised so a dot product is the cosine similarity. The
+TOP_K most similar products are stored as RelatedProduct rows and read
+back with a single indexed lookup on (product, rank).
+
+refresh_related_index() is incremental: it recomputes only the products
+changed since the last run, the products whose stored lists they appear
+in or should now enter, and lists left short by deletions. build=True
+recomputes every list (vocabulary and IDF drift slowly, so a periodic
+full rebuild keeps scores honest).
+"""
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .content import IMG_TAG_RE
+
+TOP_K = 8
+NAME_WEIGHT = 3
+CATEGORY_WEIGHT = 0.35   # share of the vector's length given to the category
+MAX_FEATURES = 1024      # most frequent terms kept; bounds memory at n x 1024 float32
+MAX_DOC_FREQUENCY = 0.5  # terms in more than half the catalogue say nothing
+CHUNK_ROWS = 256
+DELETE_CHUNK = 500
+
+WORD_RE = re.compile(r'[^\W\d_]{2,}')
+
+
+def _tokens(product):
+    words = WORD_RE.findall(product.name.lower()) * NAME_WEIGHT
+    words += WORD_RE.findall(IMG_TAG_RE.sub(' ', product.description).lower())
+    return Counter(words)
+
+
+def _vectors(products):
+    """(n x features) float32 matrix of unit rows, one per product."""
+    import numpy as np
+
+    counts = [_tokens(p) for p in products]
+    n = len(products)
+    df = Counter(term for c in counts for term in c)
+    vocabulary = [
+        term for term, freq in df.most_common()
+        if freq > 1 and freq <= MAX_DOC_FREQUENCY * n
+    ][:MAX_FEATURES]
+    columns = {term: i for i, term in enumerate(vocabulary)}
+    categories = {cid: i for i, cid in enumerate(sorted({p.category_id for p in products}))}
+
+    tf = np.zeros((n, len(columns)), dtype=np.float32)
+    for row, c in enumerate(counts):
+        for term, count in c.items():
+            column = columns.get(term)
+            if column is not None:
+                tf[row, column] = count
+    idf = np.log((1 + n) / (1 + np.array([df[t] for t in vocabulary], dtype=np.float32))) + 1
+    text = np.log1p(tf) * idf
+    norms = np.linalg.norm(text, axis=1, keepdims=True)
+    text /= np.maximum(norms, 1e-12)
+
+    category = np.zeros((n, len(categories)), dtype=np.float32)
+    category[np.arange(n), [categories[p.category_id] for p in products]] = 1
+    vectors = np.hstack([text * (1 - CATEGORY_WEIGHT), category * CATEGORY_WEIGHT])
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return vectors
+
+
+def _top_k(vectors, rows):
+    """{row: [(other row, score)]} for ``rows``, best first, in chunks."""
+    import numpy as np
+
+    k = min(TOP_K, len(vectors) - 1)
+    result = {}
+    if k <= 0:
+        return {row: [] for row in rows}
+    rows = np.asarray(rows)
+    for start in range(0, len(rows), CHUNK_ROWS):
+        chunk = rows[start:start + CHUNK_ROWS]
+        scores = vectors[chunk] @ vectors.T
+        scores[np.arange(len(chunk)), chunk] = -1  # never your own neighbour
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        for i, row in enumerate(chunk):
+            result[int(row)] = list(zip(best[i].tolist(), best_scores[i].tolist()))
+    return result
+
+
+def _dirty_rows(products, row_of, vectors, since):
+    """Rows whose stored list may be out of date since ``since``."""
+    import numpy as np
+
+    from .models import Product, RelatedProduct
+
+    changed_ids = set(Product.objects.filter(updated_at__gt=since).values_list('pk', flat=True))
+    expected = min(TOP_K, len(products) - 1)
+    stored = dict(RelatedProduct.objects.values('product_id').annotate(n=Count('pk')).values_list('product_id', 'n'))
+    # Changed products, lists showing one (it may have been edited or
+    # deactivated), lists left short by a deleted neighbour, and products
+    # with no list yet
+    listing = set(RelatedProduct.objects.filter(
+        related__updated_at__gt=since,
+    ).values_list('product_id', flat=True))
+    dirty_ids = changed_ids | listing | {pk for pk in row_of if stored.get(pk, 0) < expected}
+    dirty = {row_of[pk] for pk in dirty_ids if pk in row_of}
+
+    # A changed product may now beat the weakest neighbour of lists that
+    # do not show it yet
+    changed_rows = [row_of[pk] for pk in changed_ids if pk in row_of]
+    if changed_rows and expected > 0:
+        weakest = dict(RelatedProduct.objects.filter(rank=expected - 1).values_list('product_id', 'score'))
+        floor = np.array([weakest.get(p.pk, -1.0) for p in products], dtype=np.float32)
+        scores = vectors[changed_rows] @ vectors.T
+        dirty.update(np.nonzero((scores > floor).any(axis=0))[0].tolist())
+    return dirty
+
+
+def refresh_related_index(build=False):
+    """Bring RelatedProduct up to date; returns the number of lists rewritten."""
+    from .models import Product, RelatedProduct
+
+    started = timezone.now()
+    products = list(Product.objects.filter(is_active=True).only(
+        'pk', 'name', 'description', 'category_id',
+    ).order_by('pk'))
+    row_of = {p.pk: row for row, p in enumerate(products)}
+    vectors = _vectors(products) if products else None
+
+    since = None if build else RelatedProduct.objects.aggregate(last=Max('computed_at'))['last']
+    if since is None:
+        build = True
+        dirty = set(range(len(products)))
+    else:
+        dirty = _dirty_rows(products, row_of, vectors, since)
+
+    neighbours = _top_k(vectors, sorted(dirty)) if dirty else {}
+    entries = [
+        RelatedProduct(
+            product_id=products[row].pk, related_id=products[other].pk,
+            rank=rank, score=score, computed_at=started,
+        )
+        for row, others in neighbours.items()
+        for rank, (other, score) in enumerate(others)
+    ]
+    with transaction.atomic():
+        if build:
+            RelatedProduct.objects.all().delete()
+        else:
+            dirty_ids = [products[row].pk for row in sorted(dirty)]
+            for start in range(0, len(dirty_ids), DELETE_CHUNK):
+                RelatedProduct.objects.filter(product_id__in=dirty_ids[start:start + DELETE_CHUNK]).delete()
+            # Inactive products keep no list of their own
+            RelatedProduct.objects.filter(product__is_active=False).delete()
+        RelatedProduct.objects.bulk_create(entries, batch_size=1000)
+    return len(neighbours)
+
+
+def related_products(product, limit=4):
+    """Up to ``limit`` stored neighbours of ``product`` that are still active."""
+    from .models import RelatedProduct
+
+    entries = RelatedProduct.objects.filter(
+        product=product, related__is_active=True,
+    ).select_related('related__category').defer(
+        'related__description', 'related__description_html', 'related__description_hash',
+    ).order_by('rank')[:limit]
+    return [entry.related for entry in entries]
@@ -0,0 +1,223 @@
+"""Responsive image renditions.
+
+Every uploaded image gets a set of downscaled copies in modern formats,
+stored next to a small manifest under ``renditions/<source name>/``:
+
+    renditions/products/gown/manifest.json
+    renditions/products/gown/320.webp
+    renditions/products/gown/320.avif
+    ...
+
+Templates read the manifest (cached per worker) to build ``srcset`` and
+fall back to the original upload until the renditions exist. A missing
+manifest is cached too, until a RENDITIONS version bump says new ones
+were written. Renditions
+live in default storage: uploads are content-addressed (see
+shop.storage), so identical uploads share one set.
+"""
+import json
+import posixpath
+import time
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .cache import RENDITIONS, bump_version, get_version
+
+WIDTHS = (160, 320, 640, 960, 1280, 1920)
+
+# (mime type, Pillow format, file extension, save options), best first
+FORMATS = (
+    ('image/avif', 'AVIF', 'avif', {'quality': 55, 'speed': 6}),
+    ('image/webp', 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+)
+
+# Every ImageField that gets renditions, as (model label, field name)
+RENDITION_FIELDS = (
+    ('shop.Product', 'image'),
+    ('shop.ProductImage', 'image'),
+    ('shop.ContentImage', 'image'),
+    ('shop.HeroBanner', 'image'),
+    ('blog.Post', 'image'),
+    ('accounts.User', 'avatar'),
+)
+
+_manifests = {}
+_MANIFEST_CACHE_SIZE = 10000
+_misses = {}               # name -> RENDITIONS version it was missing at
+_version = (None, 0)       # (monotonic time of the last check, RENDITIONS version)
+VERSION_CHECK_SECONDS = 1.0
+
+
+def rendition_models():
+    for label, field_name in RENDITION_FIELDS:
+        yield apps.get_model(label), field_name
+
+
+def rendition_dir(name):
+    return posixpath.join('renditions', posixpath.splitext(name)[0])
+
+
+def supported_formats():
+    from PIL import features
+    return [f for f in FORMATS if features.check(f[1].lower())]
+
+
+def _renditions_version():
+    # One stat() a second per worker, however many images a page shows
+    global _version
+    checked, version = _version
+    now = time.monotonic()
+    if checked is None or now - checked >= VERSION_CHECK_SECONDS:
+        version = get_version(RENDITIONS)
+        _version = (now, version)
+    return version
+
+
+def _forget(name):
+    _manifests.pop(name, None)
+    _misses.pop(name, None)
+
+
+def get_manifest(fieldfile):
+    """Rendition manifest for an image, or None if not generated yet."""
+    if not fieldfile:
+        return None
+    manifest = _manifests.get(fieldfile.name)
+    if manifest is not None:
+        return manifest
+    version = _renditions_version()
+    if _misses.get(fieldfile.name) == version:
+        return None
+    path = posixpath.join(rendition_dir(fieldfile.name), 'manifest.json')
+    try:
+        with default_storage.open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        if len(_misses) >= _MANIFEST_CACHE_SIZE:
+            _misses.clear()
+        _misses[fieldfile.name] = version
+        return None
+    if len(_manifests) >= _MANIFEST_CACHE_SIZE:
+        _manifests.clear()
+    _misses.pop(fieldfile.name, None)
+    _manifests[fieldfile.name] = manifest
+    return manifest
+
+
+def srcsets(fieldfile):
+    """[(mime type, srcset)] for an image, best format first."""
+    manifest = get_manifest(fieldfile)
+    if not manifest:
+        return []
+    storage = default_storage
+    base = rendition_dir(fieldfile.name)
+    return [
+        (fmt['type'], ', '.join(
+            f"{storage.url(posixpath.join(base, f'{w}.' + fmt['ext']))} {w}w"
+            for w in manifest['widths']
+        ))
+        for fmt in manifest['formats']
+    ]
+
+
+def rendition_url(fieldfile, width):
+    """URL of the smallest rendition at least ``width`` wide (or the original)."""
+    manifest = get_manifest(fieldfile)
+    if not manifest:
+        return fieldfile.url
+    widths = manifest['widths']
+    if not widths or not manifest['formats']:
+        # Written by a Pillow with neither AVIF nor WebP support
+        return fieldfile.url
+    best = next((w for w in widths if w >= width), widths[-1])
+    ext = manifest['formats'][-1]['ext']
+    return default_storage.url(posixpath.join(rendition_dir(fieldfile.name), f'{best}.{ext}'))
+
+
+def generate_renditions(fieldfile, force=False):
+    """Write all width/format presets for an image. Returns the manifest."""
+    from PIL import Image
+
+    from .imaging import decode_image, open_image, orientation, oriented_size, upright
+
+    if not fieldfile:
+        return None
+    if not force:
+        manifest = get_manifest(fieldfile)
+        if manifest:
+            return manifest
+
+    storage = default_storage
+    base = rendition_dir(fieldfile.name)
+    formats = supported_formats()
+
+    with fieldfile.storage.open(fieldfile.name) as f:
+        img = open_image(f)
+        turn = orientation(img)
+        img, _ = decode_image(img, min(1.0, max(WIDTHS) / oriented_size(img)[0]))
+        img = upright(img, turn)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+        source_width, source_height = img.size
+
+        largest = min(source_width, max(WIDTHS))
+        widths = [w for w in WIDTHS if w < largest] + [largest]
+        for width in widths:
+            height = max(1, round(source_height * width / source_width))
+            resized = img if width == source_width else img.resize((width, height), Image.LANCZOS)
+            for _, pil_format, ext, options in formats:
+                buffer = BytesIO()
+                resized.save(buffer, format=pil_format, **options)
+                name = posixpath.join(base, f'{width}.{ext}')
+                if storage.exists(name):
+                    storage.delete(name)
+                storage.save(name, ContentFile(buffer.getvalue()))
+
+    manifest = {
+        'width': source_width,
+        'height': source_height,
+        'widths': widths,
+        'formats': [{'type': mime, 'ext': ext} for mime, _, ext, _ in formats],
+    }
+    manifest_name = posixpath.join(base, 'manifest.json')
+    if storage.exists(manifest_name):
+        storage.delete(manifest_name)
+    storage.save(manifest_name, ContentFile(json.dumps(manifest).encode()))
+    _forget(fieldfile.name)
+    _manifests[fieldfile.name] = manifest
+    # Other workers may have cached the image as having none
+    bump_version(RENDITIONS)
+    return manifest
+
+
+def delete_renditions(name, storage):
+    base = rendition_dir(name)
+    try:
+        _, files = storage.listdir(base)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        storage.delete(posixpath.join(base, filename))
+    _forget(name)
+
+
+def move_renditions(old_name, new_name, storage):
+    """Hand the renditions of ``old_name`` over to ``new_name``, the same bytes stored again."""
+    old_base, new_base = rendition_dir(old_name), rendition_dir(new_name)
+    try:
+        _, files = storage.listdir(old_base)
+    except FileNotFoundError:
+        return
+    if 'manifest.json' in files and not storage.exists(posixpath.join(new_base, 'manifest.json')):
+        # The manifest last: it is what marks the set complete
+        for filename in sorted(files, key=lambda f: f == 'manifest.json'):
+            target = posixpath.join(new_base, filename)
+            if storage.exists(target):
+                storage.delete(target)
+            with storage.open(posixpath.join(old_base, filename)) as f:
+                storage.save(target, f)
+    delete_renditions(old_name, storage)
+    _manifests.pop(new_name, None)
@@ -0,0 +1,250 @@
+"""Full-text search over products, posts and pages.
+
+Every searchable object has a SearchEntry row (title plus plain-text
+body) that is upserted from post_save signals. The text index over those
+rows is maintained by the database itself, so saving an object is the
+whole incremental update:
+
+- PostgreSQL: a generated, weighted tsvector column with a GIN index
+- SQLite: an external-content FTS5 table kept in sync by triggers
+
+search() ranks matches (title above body) and returns highlighted
+snippets.
+"""
+import re
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .content import IMG_TAG_RE
+
+SEARCH_LIMIT = 50
+MAX_TERMS = 8
+TERM_RE = re.compile(r'[^\W_]+')
+
+# model label -> SearchEntry.kind
+SEARCH_MODELS = {
+    'shop.Product': 'product',
+    'blog.Post': 'post',
+    'shop.Page': 'page',
+}
+
+# Highlight markers: private-use characters that survive HTML escaping
+MARK_START, MARK_END = '\ue000', '\ue001'
+
+POSTGRES_INDEX = [
+    """
+    ALTER TABLE shop_searchentry ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple'::regconfig, coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple'::regconfig, coalesce(body, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX IF NOT EXISTS shop_searchentry_vector ON shop_searchentry USING GIN (search_vector)',
+]
+POSTGRES_DROP = ['ALTER TABLE shop_searchentry DROP COLUMN IF EXISTS search_vector']
+
+SQLITE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS shop_searchentry_fts USING fts5(
+        title, body, content='shop_searchentry', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS shop_searchentry_fts_insert AFTER INSERT ON shop_searchentry BEGIN
+        INSERT INTO shop_searchentry_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS shop_searchentry_fts_delete AFTER DELETE ON shop_searchentry BEGIN
+        INSERT INTO shop_searchentry_fts(shop_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS shop_searchentry_fts_update AFTER UPDATE ON shop_searchentry BEGIN
+        INSERT INTO shop_searchentry_fts(shop_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO shop_searchentry_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+    # Re-index existing rows; a no-op when the table was just created
+    "INSERT INTO shop_searchentry_fts(shop_searchentry_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS shop_searchentry_fts_insert',
+    'DROP TRIGGER IF EXISTS shop_searchentry_fts_delete',
+    'DROP TRIGGER IF EXISTS shop_searchentry_fts_update',
+    'DROP TABLE IF EXISTS shop_searchentry_fts',
+]
+
+
+@dataclass(frozen=True)
+class SearchResult:
+    kind: str
+    title: str
+    url: str
+    snippet: str
+
+
+def _execute_all(conn, statements):
+    with conn.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def install_search_index(conn=connection):
+    """Create the vendor-specific text index. Idempotent.
+
+    On SQLite, Django rebuilds a table for most schema changes, which
+    drops its triggers; rebuild_search_index runs this again to restore
+    them.
+    """
+    if conn.vendor == 'postgresql':
+        _execute_all(conn, POSTGRES_INDEX)
+    elif conn.vendor == 'sqlite':
+        _execute_all(conn, SQLITE_INDEX)
+
+
+def uninstall_search_index(conn=connection):
+    if conn.vendor == 'postgresql':
+        _execute_all(conn, POSTGRES_DROP)
+    elif conn.vendor == 'sqlite':
+        _execute_all(conn, SQLITE_DROP)
+
+
+def search_text(text):
+    """Indexable plain text: rich-content image tags removed."""
+    return IMG_TAG_RE.sub(' ', text or '')
+
+
+def _document(instance):
+    """(kind, SearchEntry fields) for a searchable object."""
+    kind = SEARCH_MODELS[instance._meta.label]
+    if kind == 'product':
+        return kind, {
+            'title': instance.name,
+            'body': search_text(instance.description),
+            'url': reverse('product_detail', args=[instance.slug]),
+            'is_public': instance.is_active,
+        }
+    if kind == 'post':
+        return kind, {
+            'title': instance.title,
+            'body': search_text(instance.content),
+            'url': reverse('post_detail', args=[instance.slug]),
+            'is_public': True,
+        }
+    return kind, {
+        'title': instance.title,
+        'body': instance.content,
+        'url': instance.get_absolute_url(),
+        'is_public': instance.is_active,
+    }
+
+
+def index_object(instance):
+    from .models import SearchEntry
+
+    kind, fields = _document(instance)
+    SearchEntry.objects.update_or_create(kind=kind, object_id=instance.pk, defaults=fields)
+
+
+def index_objects(instances):
+    """index_object() for many new objects of one model, in bulk."""
+    from .models import SearchEntry
+
+    entries = []
+    for instance in instances:
+        kind, fields = _document(instance)
+        entries.append(SearchEntry(kind=kind, object_id=instance.pk, **fields))
+    SearchEntry.objects.bulk_create(entries, batch_size=500)
+
+
+def remove_object(instance):
+    from .models import SearchEntry
+
+    SearchEntry.objects.filter(kind=SEARCH_MODELS[instance._meta.label], object_id=instance.pk).delete()
+
+
+def rebuild_index():
+    """Re-create every SearchEntry from the source tables. Returns the count."""
+    from django.apps import apps
+
+    from .models import SearchEntry
+
+    entries = []
+    for label in SEARCH_MODELS:
+        for instance in apps.get_model(label).objects.iterator():
+            kind, fields = _document(instance)
+            entries.append(SearchEntry(kind=kind, object_id=instance.pk, **fields))
+    with transaction.atomic():
+        SearchEntry.objects.all().delete()
+        SearchEntry.objects.bulk_create(entries, batch_size=500)
+        install_search_index()
+    return len(entries)
+
+
+def query_terms(query):
+    return TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def _postgres_query(terms, limit):
+    # Rank in the inner query so ts_headline only runs on the rows shown
+    sql = """
+        SELECT kind, title, url, ts_headline('simple', body, query, %s)
+        FROM (
+            SELECT e.kind, e.title, e.url, e.body, q.query, ts_rank(e.search_vector, q.query) AS rank
+            FROM shop_searchentry e, to_tsquery('simple', %s) AS q(query)
+            WHERE e.search_vector @@ q.query AND e.is_public
+            ORDER BY rank DESC
+            LIMIT %s
+        ) AS top
+        ORDER BY rank DESC
+    """
+    options = (
+        f'StartSel={MARK_START}, StopSel={MARK_END}, '
+        'MaxWords=30, MinWords=12, MaxFragments=2, FragmentDelimiter=" … "'
+    )
+    return sql, [options, ' & '.join(f'{t}:*' for t in terms), limit]
+
+
+def _sqlite_query(terms, limit):
+    sql = """
+        SELECT e.kind, e.title, e.url,
+               snippet(shop_searchentry_fts, 1, %s, %s, %s, 24)
+        FROM shop_searchentry_fts
+        JOIN shop_searchentry e ON e.id = shop_searchentry_fts.rowid
+        WHERE shop_searchentry_fts MATCH %s AND e.is_public
+        ORDER BY bm25(shop_searchentry_fts, 10.0, 1.0)
+        LIMIT %s
+    """
+    match = ' '.join(f'"{t}"*' for t in terms)
+    return sql, [MARK_START, MARK_END, ' … ', match, limit]
+
+
+def _highlight(snippet):
+    html = escape(snippet or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    return mark_safe(html)
+
+
+def search(query, limit=SEARCH_LIMIT):
+    """Ranked public results for ``query``; every term must match (as a prefix)."""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    if connection.vendor == 'postgresql':
+        sql, params = _postgres_query(terms, limit)
+    else:
+        sql, params = _sqlite_query(terms, limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return [
+        SearchResult(kind=kind, title=title, url=url, snippet=_highlight(snippet))
+        for kind, title, url, snippet in rows
+    ]
@@ -0,0 +1,166 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from blog.models import Comment, Post
+
+from .cache import HOME_PAGE, PAGES, SITE_CHROME, bump_version
+from .models import (
+    Category, ContentImage, HeroBanner, MenuItem, Page, Popup, Product, ProductImage, SiteSetting,
+)
+from .jobs import enqueue
+from .renditions import get_manifest, rendition_models
+from .search import index_object, remove_object
+from .storage import blob_fields
+from .theme import write_theme_css
+
+
+# Connected before invalidate_site_chrome: the new version stamp is the
+# theme.css cache-buster, so the file must be written first.
+#
+# The version bumps wait for the commit: a bump inside the transaction
+# lets another worker re-cache the old rows under the new version.
+@receiver(post_save, sender=SiteSetting)
+@receiver(post_delete, sender=SiteSetting)
+def rebuild_theme_css(sender, instance, signal, **kwargs):
+    write_theme_css(instance if signal is post_save else None)
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=SiteSetting)
+@receiver(post_delete, sender=SiteSetting)
+def invalidate_site_chrome(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(SITE_CHROME))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=HeroBanner)
+@receiver(post_delete, sender=HeroBanner)
+@receiver(post_save, sender=Popup)
+@receiver(post_delete, sender=Popup)
+def invalidate_home_page(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(HOME_PAGE))
+
+
+# Also covers pages created by _auto_create_page_if_needed()
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+def invalidate_page_registry(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(PAGES))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Page)
+def update_search_entry(sender, instance, **kwargs):
+    index_object(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Page)
+def delete_search_entry(sender, instance, **kwargs):
+    remove_object(instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def queue_related_refresh(sender, **kwargs):
+    # One queued refresh covers every change made before it runs
+    enqueue('related.refresh', key='related:refresh')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+def queue_sitemaps(sender, **kwargs):
+    enqueue('sitemaps.publish', key='sitemaps:publish')
+
+
+@receiver(post_save, sender=ContentImage)
+@receiver(post_delete, sender=ContentImage)
+def recompile_product_content(sender, instance, **kwargs):
+    product = Product.objects.filter(pk=instance.product_id).first()
+    if product:
+        product.recompile_content()
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product(sender, instance, origin=None, **kwargs):
+    # The gallery has no timestamp of its own: the product page's
+    # Last-Modified is the product's updated_at
+    if isinstance(origin, Product) or isinstance(origin, QuerySet) and origin.model is Product:
+        return  # the product itself is going
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def count_comments(sender, instance, signal, created=False, origin=None, **kwargs):
+    if signal is post_save and not created:
+        return  # an edit
+    # The post itself is going: Post.delete(), or QuerySet.delete() on posts
+    if isinstance(origin, Post) or isinstance(origin, QuerySet) and origin.model is Post:
+        return
+    # updated_at moves too: it is the post page's Last-Modified
+    Post.objects.filter(pk=instance.post_id).update(
+        comment_count=F('comment_count') + (1 if created else -1),
+        updated_at=timezone.now(),
+    )
+
+
+def _rendition_receiver(field_name):
+    def queue_renditions(sender, instance, **kwargs):
+        fieldfile = getattr(instance, field_name)
+        if fieldfile and get_manifest(fieldfile) is None:
+            label = sender._meta.label
+            enqueue(
+                'images.renditions', key=f'renditions:{label}:{instance.pk}:{fieldfile.name}',
+                model=label, pk=instance.pk, field=field_name,
+            )
+
+    return queue_renditions
+
+
+for _model, _field_name in rendition_models():
+    post_save.connect(
+        _rendition_receiver(_field_name), sender=_model, weak=False,
+        dispatch_uid=f'renditions:{_model._meta.label}.{_field_name}',
+    )
+
+
+# Wherever a row goes (a view, the admin, a cascade from its product or
+# user), its files lose a reference. Queued inside the delete's
+# transaction, so gc_media sees the release as soon as the row is gone.
+def _release_receiver(field_names):
+    def release_files(sender, instance, **kwargs):
+        names = [getattr(instance, name).name for name in field_names]
+        names = [name for name in names if name]
+        if names:
+            enqueue('files.delete', names=names)
+
+    return release_files
+
+
+_blob_fields = defaultdict(list)
+for _model, _field_name in blob_fields():
+    _blob_fields[_model].append(_field_name)
+for _model, _field_names in _blob_fields.items():
+    post_delete.connect(
+        _release_receiver(_field_names), sender=_model, weak=False,
+        dispatch_uid=f'release:{_model._meta.label}',
+    )
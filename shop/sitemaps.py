@@ -0,0 +1,250 @@
+"""Sitemaps and Atom feeds, written as static files for nginx to serve.
+
+publish_sitemaps() writes under STATIC_ROOT:
+
+    sitemaps/sitemap.xml               the index, served as /sitemap.xml
+    sitemaps/sitemap-<kind>-<n>.xml    one shard, served from the site root
+    feeds/journal.atom, feeds/products.atom
+
+Shard n of a kind holds the rows with pk in [n * SHARD_SIZE, (n + 1) *
+SHARD_SIZE), so no shard can pass the protocol's 50,000 URL limit and an
+edited row only ever touches its own shard. One grouped query per kind
+fingerprints every shard (URL count and latest updated_at); only shards
+whose fingerprint moved, or whose file is missing, are written again.
+"""
+import json
+import os
+from contextlib import contextmanager
+from datetime import timezone as dt_timezone
+from pathlib import Path
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.db.models import BigIntegerField, Count, ExpressionWrapper, F, Max
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+SHARD_SIZE = 50000
+FEED_ENTRIES = 20
+SUMMARY_WORDS = 60
+ITERATOR_CHUNK = 2000
+
+SITEMAP_DIR = 'sitemaps'
+FEED_DIR = 'feeds'
+STATE_FILE = 'sitemaps.json'
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def _sources():
+    """{kind: (queryset, url name)} for every sharded kind."""
+    from blog.models import Post
+
+    from .models import Page, Product
+
+    return {
+        'products': (Product.objects.filter(is_active=True), 'product_detail'),
+        'journal': (Post.objects.all(), 'post_detail'),
+        'pages': (Page.objects.filter(is_active=True), 'page_detail'),
+    }
+
+
+def _absolute(path):
+    return settings.SITE_URL.rstrip('/') + path
+
+
+def _w3c(value):
+    return value.astimezone(dt_timezone.utc).isoformat(timespec='seconds')
+
+
+def _output_dir(name):
+    return Path(settings.STATIC_ROOT) / name
+
+
+@contextmanager
+def _atomic_file(path):
+    """Write ``path`` through a temporary file, replacing it only on success."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            yield f
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _write_if_changed(path, content):
+    """Keep the file (and its mtime, which nginx's ETag uses) when nothing changed."""
+    try:
+        if path.read_text(encoding='utf-8') == content:
+            return False
+    except FileNotFoundError:
+        pass
+    with _atomic_file(path) as f:
+        f.write(content)
+    return True
+
+
+# ── Sitemaps ──
+
+
+def _fingerprints(kind, queryset):
+    """{shard number: [url count, latest updated_at]} from one grouped query."""
+    shard = ExpressionWrapper(F('pk') / SHARD_SIZE, output_field=BigIntegerField())
+    rows = queryset.order_by().annotate(shard=shard).values('shard').annotate(
+        count=Count('pk'), last=Max('updated_at'),
+    )
+    return {row['shard']: [row['count'], _w3c(row['last'])] for row in rows}
+
+
+def _write_shard(path, queryset, url_name, number):
+    rows = queryset.filter(
+        pk__gte=number * SHARD_SIZE, pk__lt=(number + 1) * SHARD_SIZE,
+    ).order_by('pk').values_list('slug', 'updated_at')
+    with _atomic_file(path) as f:
+        f.write(f'{XML_HEADER}<urlset xmlns="{SITEMAP_NS}">\n')
+        for slug, updated_at in rows.iterator(chunk_size=ITERATOR_CHUNK):
+            loc = escape(_absolute(reverse(url_name, args=[slug])))
+            f.write(f'<url><loc>{loc}</loc><lastmod>{_w3c(updated_at)}</lastmod></url>\n')
+        f.write('</urlset>\n')
+
+
+def _main_shard():
+    """The listing pages, which have no row of their own."""
+    urls = ''.join(
+        f'<url><loc>{escape(_absolute(reverse(name)))}</loc></url>\n'
+        for name in ('home', 'product_list', 'post_list')
+    )
+    return f'{XML_HEADER}<urlset xmlns="{SITEMAP_NS}">\n{urls}</urlset>\n'
+
+
+def _sitemap_index(shards):
+    entries = ''.join(
+        f'<sitemap><loc>{escape(_absolute("/" + name))}</loc>'
+        + (f'<lastmod>{lastmod}</lastmod>' if lastmod else '')
+        + '</sitemap>\n'
+        for name, lastmod in shards
+    )
+    return f'{XML_HEADER}<sitemapindex xmlns="{SITEMAP_NS}">\n{entries}</sitemapindex>\n'
+
+
+def _state_path():
+    return Path(settings.STATE_DIR) / STATE_FILE
+
+
+def _load_state():
+    try:
+        return json.loads(_state_path().read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_state(state):
+    with _atomic_file(_state_path()) as f:
+        json.dump(state, f)
+
+
+def is_published():
+    """Whether the sitemap index and both feeds are on disk."""
+    return (_output_dir(SITEMAP_DIR) / 'sitemap.xml').exists() and all(
+        (_output_dir(FEED_DIR) / name).exists() for name in ('journal.atom', 'products.atom')
+    )
+
+
+def publish_sitemaps(full=False):
+    """Bring the sitemap files up to date; returns the names written."""
+    directory = _output_dir(SITEMAP_DIR)
+    previous = {} if full else _load_state()
+    state, written = {}, []
+
+    for kind, (queryset, url_name) in _sources().items():
+        for number, fingerprint in _fingerprints(kind, queryset).items():
+            name = f'sitemap-{kind}-{number}.xml'
+            state[name] = fingerprint
+            if previous.get(name) != fingerprint or not (directory / name).exists():
+                _write_shard(directory / name, queryset, url_name, number)
+                written.append(name)
+
+    # Shards left empty by deletions or deactivations
+    for name in set(previous) - set(state):
+        (directory / name).unlink(missing_ok=True)
+        written.append(name)
+
+    if _write_if_changed(directory / 'sitemap-main.xml', _main_shard()):
+        written.append('sitemap-main.xml')
+    shards = [('sitemap-main.xml', None)] + sorted((name, last) for name, (_, last) in state.items())
+    if _write_if_changed(directory / 'sitemap.xml', _sitemap_index(shards)):
+        written.append('sitemap.xml')
+    _save_state(state)
+    return written
+
+
+# ── Atom feeds ──
+
+
+def _summary(html):
+    return Truncator(strip_tags(html)).words(SUMMARY_WORDS)
+
+
+def _atom(title, author, path, feed_path, entries):
+    """An Atom document; ``entries`` are dicts of title, path, updated, published, summary
+    and optionally author (the feed's author stands in otherwise).
+    """
+    updated = max((e['updated'] for e in entries), default=None) or timezone.now()
+    parts = [
+        f'{XML_HEADER}<feed xmlns="http://www.w3.org/2005/Atom">\n',
+        f'<title>{escape(title)}</title>\n',
+        f'<id>{escape(_absolute(path))}</id>\n',
+        f'<link href={quoteattr(_absolute(path))}/>\n',
+        f'<link rel="self" href={quoteattr(_absolute(feed_path))}/>\n',
+        f'<updated>{_w3c(updated)}</updated>\n',
+        f'<author><name>{escape(author)}</name></author>\n',
+    ]
+    for entry in entries:
+        url = _absolute(entry['path'])
+        author = f'<author><name>{escape(entry["author"])}</name></author>' if entry.get('author') else ''
+        parts.append(
+            f'<entry><title>{escape(entry["title"])}</title><id>{escape(url)}</id>'
+            f'<link href={quoteattr(url)}/><published>{_w3c(entry["published"])}</published>'
+            f'<updated>{_w3c(entry["updated"])}</updated>{author}'
+            f'<summary>{escape(entry["summary"])}</summary></entry>\n'
+        )
+    parts.append('</feed>\n')
+    return ''.join(parts)
+
+
+def publish_feeds():
+    """Write the journal and new-products feeds; returns the names written."""
+    from blog.models import Post
+
+    from .models import Product, SiteSetting
+
+    site_settings = SiteSetting.objects.first()
+    site_name = getattr(site_settings, 'site_name', '') or 'Atelier des Poupees'
+    posts = Post.objects.select_related('author').order_by('-created_at', '-pk')[:FEED_ENTRIES]
+    products = Product.objects.filter(is_active=True).order_by('-created_at', '-pk')[:FEED_ENTRIES]
+
+    journal = [{
+        'title': post.title, 'path': reverse('post_detail', args=[post.slug]),
+        'published': post.created_at, 'updated': post.updated_at,
+        'author': post.author.get_username(), 'summary': _summary(post.content_html),
+    } for post in posts]
+    new_pieces = [{
+        'title': product.name, 'path': reverse('product_detail', args=[product.slug]),
+        'published': product.created_at, 'updated': product.updated_at,
+        'summary': _summary(product.description_html),
+    } for product in products]
+
+    feeds = {
+        'journal.atom': (f'{site_name} — Journal', reverse('post_list'), journal),
+        'products.atom': (f'{site_name} — New pieces', reverse('product_list'), new_pieces),
+    }
+    directory = _output_dir(FEED_DIR)
+    return [
+        name for name, (title, path, entries) in feeds.items()
+        if _write_if_changed(directory / name, _atom(title, site_name, path, f'/{FEED_DIR}/{name}', entries))
+    ]
@@ -0,0 +1,120 @@
+"""Content-addressed storage for uploaded images.
+
+Every ImageField stores its files here, named after the SHA-256 of their
+bytes:
+
+    blobs/3f/a2/3fa2…e1.jpg
+
+Saving bytes that are already stored writes nothing and returns the
+existing name. The Product and journal Post made from one upload, or a
+photo uploaded again into another gallery, share a single file, and so
+share its renditions. A MediaBlob row counts the references: save() adds
+one and delete() drops one, removing the file with the last.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+BLOB_DIR = 'blobs'
+
+
+def blob_name(digest, ext):
+    return posixpath.join(BLOB_DIR, digest[:2], digest[2:4], digest + ext)
+
+
+def is_blob(name):
+    return name.startswith(BLOB_DIR + '/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # _save() names the file after its content; equal names are the point
+        return name
+
+    def _save(self, name, content):
+        from .models import MediaBlob
+
+        directory = self.path(BLOB_DIR)
+        os.makedirs(directory, exist_ok=True)
+        # Hash while spooling to a temporary file beside the blobs, so the
+        # final move is a rename on the same filesystem
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    f.write(chunk)
+            name = blob_name(digest.hexdigest(), posixpath.splitext(name)[1].lower())
+            path = self.path(name)
+            # The row lock orders this against a delete() of the same blob
+            with transaction.atomic():
+                blob, created = MediaBlob.objects.select_for_update().get_or_create(
+                    name=name, defaults={'size': os.path.getsize(tmp_path)},
+                )
+                if not created:
+                    MediaBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(tmp_path, self.file_permissions_mode)
+                    os.replace(tmp_path, path)
+                else:
+                    # A fresh mtime keeps gc_media's grace period over the
+                    # row about to refer to it
+                    os.utime(path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        return name
+
+    def retain(self, name):
+        """Add a reference to a stored blob without saving it again."""
+        from .models import MediaBlob
+
+        MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+    def release(self, name):
+        """Drop a reference to ``name``; returns True if the file was removed.
+
+        Files stored before this backend have no MediaBlob row and are
+        removed straight away.
+        """
+        from .models import MediaBlob
+
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.refcount > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') - 1)
+                return False
+            if blob is not None:
+                blob.delete()
+            super().delete(name)
+        return True
+
+    def delete(self, name):
+        self.release(name)
+
+
+_blob_storage = ContentAddressedStorage()
+
+
+def blob_storage():
+    """The storage of every ImageField (a callable, so migrations refer to it by name)."""
+    return _blob_storage
+
+
+def blob_fields():
+    """(model, field name) for every file field kept in blob storage."""
+    from django.apps import apps
+    from django.db.models import FileField
+
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, FileField) and field.storage is _blob_storage:
+                yield model, field.name
@@ -0,0 +1,74 @@
+import logging
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .cache import HOME_PAGE, bump_version
+from .imaging import ImageTooLarge, crop_image
+from .jobs import enqueue, task
+from .models import ContentImage, HeroBanner
+from .related import refresh_related_index
+from .renditions import delete_renditions, generate_renditions
+from .sitemaps import publish_feeds, publish_sitemaps
+from .storage import blob_storage
+
+logger = logging.getLogger(__name__)
+
+
+@task('images.crop_banner')
+def crop_banner(banner_id, image_name):
+    banner = HeroBanner.objects.filter(pk=banner_id).first()
+    # Skip if the banner was deleted or got a new image in the meantime
+    if banner is None or banner.image.name != image_name:
+        return
+    try:
+        with banner.image.open('rb') as f:
+            cropped = crop_image(f, banner.crop_x, banner.crop_y, banner.crop_width, banner.crop_height)
+    except ImageTooLarge as e:
+        # Retrying cannot help; the banner keeps the uncropped upload
+        logger.warning('Not cropping banner %s: %s', banner_id, e)
+        return
+    with cropped:
+        banner.image.save(cropped.name, cropped, save=False)
+    banner.save(update_fields=['image', 'updated_at'])
+    enqueue('files.delete', names=[image_name])
+
+
+@task('images.renditions')
+def make_renditions(model, pk, field):
+    instance = apps.get_model(model).objects.filter(pk=pk).first()
+    if instance is None or not getattr(instance, field):
+        return
+    try:
+        generate_renditions(getattr(instance, field))
+    except ImageTooLarge as e:
+        logger.warning('No renditions for %s %s: %s', model, pk, e)
+        return
+    if isinstance(instance, ContentImage):
+        instance.product.recompile_content()
+    # Pages showing the image now carry srcset: refresh their validators
+    # and the cached home page
+    owner = instance.product if hasattr(instance, 'product_id') else instance
+    if any(f.name == 'updated_at' for f in owner._meta.fields):
+        type(owner).objects.filter(pk=owner.pk).update(updated_at=timezone.now())
+    bump_version(HOME_PAGE)
+
+
+@task('files.delete')
+def delete_files(names):
+    # Each name is one reference released; a shared file stays until its last
+    for name in names:
+        if blob_storage().release(name):
+            delete_renditions(name, default_storage)
+
+
+@task('related.refresh')
+def refresh_related(build=False):
+    refresh_related_index(build=build)
+
+
+@task('sitemaps.publish')
+def publish(full=False):
+    publish_sitemaps(full=full)
+    publish_feeds()
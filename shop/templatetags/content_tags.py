@@ -1,7 +1,8 @@
-import re
 from django import template
 from django.utils.safestring import mark_safe
-from django.utils.html import escape
+
+from shop.content import content_image_map, render_rich_content
+from shop.renditions import get_manifest, rendition_url, srcsets
 
 register = template.Library()
 
@@ -18,29 +19,34 @@ def krw(value):
 
 @register.filter
 def render_content(text, content_images):
-    """Replace [img:N] tags with actual images, then apply linebreaks."""
-    text = escape(text)
-
-    image_map = {}
-    if content_images:
-        for img in content_images:
-            image_map[img.number] = img.image.url
-
-    def replace_tag(match):
-        num = int(match.group(1))
-        url = image_map.get(num)
-        if url:
-            return (
-                f'</p>'
-                f'<figure class="my-8">'
-                f'<img src="{url}" alt="" class="w-full rounded-lg shadow-md">'
-                f'</figure>'
-                f'<p>'
-            )
-        return match.group(0)
-
-    text = re.sub(r'\[img:(\d+)\]', replace_tag, text)
-    text = text.replace('\r\n', '\n').replace('\r', '\n')
-    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-    result = '\n'.join(f'<p class="mb-4">{p.replace(chr(10), "<br>")}</p>' for p in paragraphs)
-    return mark_safe(result)
+    """Replace [img:N] tags with actual images, then apply linebreaks.
+
+    Product, Post and Page store precompiled HTML; this filter is for
+    text that has none.
+    """
+    image_map = content_image_map(content_images) if content_images else {}
+    return mark_safe(render_rich_content(text, image_map))
+
+
+@register.inclusion_tag('shop/responsive_image.html')
+def responsive_image(image, alt='', sizes='100vw', css_class='', loading='lazy'):
+    """<picture> with AVIF/WebP srcsets for an ImageField, original as fallback."""
+    manifest = get_manifest(image) if image else None
+    return {
+        'image': image,
+        'sources': srcsets(image) if image else [],
+        'width': manifest and manifest['width'],
+        'height': manifest and manifest['height'],
+        'alt': alt,
+        'sizes': sizes,
+        'css_class': css_class,
+        'loading': loading,
+    }
+
+
+@register.filter
+def rendition(image, width):
+    """URL of a rendition at least ``width`` pixels wide."""
+    if not image:
+        return ''
+    return rendition_url(image, int(width))
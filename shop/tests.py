@@ -0,0 +1,385 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from blog.models import Comment, Post
+
+from . import metrics, renditions
+from .benchmark import default_scenarios, generate_catalogue
+from .bulk import delete_products
+from .cache import HOME_PAGE, PAGES, SITE_CHROME, bump_version, get_version
+from .catalogue import ImageArchive, import_batch, parse_record
+from .jobs import run_next
+from .models import Category, Job, MediaBlob, MenuItem, Page, Popup, Product, ProductImage
+from .querybudget import QueryBudgetExceeded, QueryBudgetMiddleware, query_budget
+from .warmup import warm_up
+
+User = get_user_model()
+
+TEMP_DIR = Path(tempfile.mkdtemp(prefix='atelier-tests-'))
+
+
+@override_settings(
+    MEDIA_ROOT=str(TEMP_DIR / 'media'),
+    STATE_DIR=TEMP_DIR / 'state',
+    JOBS_EAGER=False,
+    QUERY_BUDGET_HEADERS=True,
+    QUERY_BUDGET_STRICT=True,
+)
+class PublicViewTests(TestCase):
+    """Every public view against a catalogue big enough to show an N+1."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalogue(products=60, posts=30, comments=300, users=5, images=2, log=lambda *args: None)
+        cls.scenarios = [(name, url) for name, url, staff in default_scenarios() if not staff]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        # The home page is cached per process across tests otherwise
+        cache.clear()
+
+    def test_within_query_budget(self):
+        # Strict mode raises QueryBudgetExceeded, which the client re-raises
+        for name, url in self.scenarios:
+            with self.subTest(name):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                budget = getattr(resolve(url.split('?')[0]).func, 'query_budget', None)
+                if budget is not None:
+                    self.assertLessEqual(int(response['X-Query-Count']), budget)
+
+    def test_async_views_render(self):
+        by_name = dict(self.scenarios)
+        for name, template in (
+            ('home', 'home.html'),
+            ('product_detail', 'shop/product_detail.html'),
+            ('post_detail', 'blog/post_detail.html'),
+        ):
+            with self.subTest(name):
+                response = self.client.get(by_name[name])
+                self.assertEqual(response.status_code, 200)
+                self.assertTemplateUsed(response, template)
+
+    async def test_async_views_render_through_asgi(self):
+        by_name = dict(self.scenarios)
+        for name in ('home', 'product_detail', 'post_detail'):
+            with self.subTest(name):
+                response = await self.async_client.get(by_name[name])
+                self.assertEqual(response.status_code, 200)
+
+    def test_feeds_advertised(self):
+        response = self.client.get(dict(self.scenarios)['home'])
+        self.assertContains(response, 'href="/feeds/journal.atom"')
+        self.assertContains(response, 'href="/feeds/products.atom"')
+
+    def test_new_login_does_not_revalidate_old_page(self):
+        # Logging in again rotates the CSRF secret: the old copy's forms are dead
+        url = dict(self.scenarios)['post_detail']
+        credentials = {'username': 'bench-user-0', 'password': 'bench'}
+        self.client.post(reverse('login'), credentials)
+        first = self.client.get(url)
+        self.client.post(reverse('logout'))
+        self.client.post(reverse('login'), credentials)
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 200)
+
+
+@override_settings(MEDIA_ROOT=str(TEMP_DIR / 'media'), STATE_DIR=TEMP_DIR / 'state', JOBS_EAGER=False)
+class ImageReplacementTests(TestCase):
+    """An edit that uploads a new image releases the reference of the old one."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalogue(products=3, posts=3, comments=0, users=1, images=2, log=lambda *args: None)
+        cls.staff = User.objects.create_user('editor', password='editor', is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def upload(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), 'teal').save(buffer, 'PNG')
+        return SimpleUploadedFile('new.png', buffer.getvalue(), content_type='image/png')
+
+    def released(self):
+        return [name for job in Job.objects.filter(task='files.delete') for name in job.payload['names']]
+
+    def test_product_edit_releases_replaced_images(self):
+        post = Post.objects.exclude(related_product=None).select_related('related_product').first()
+        product = post.related_product
+        post.image = Product.objects.exclude(pk=product.pk).first().image.name
+        post.save()
+        old = [product.image.name, post.image.name]
+        self.client.post(reverse('manage_edit', args=[product.pk]), {
+            'title': product.name, 'category': product.category_id,
+            'content': product.description, 'image': self.upload(),
+        })
+        self.assertEqual(sorted(self.released()), sorted(old))
+
+    def test_product_edit_without_upload_releases_nothing(self):
+        product = Product.objects.first()
+        self.client.post(reverse('manage_edit', args=[product.pk]), {
+            'title': product.name, 'category': product.category_id, 'content': product.description,
+        })
+        self.assertEqual(self.released(), [])
+
+    def test_popup_edit_releases_replaced_image(self):
+        old = Product.objects.first().image.name
+        popup = Popup.objects.create(title='Sale', popup_type='banner', image=old)
+        self.client.post(reverse('manage_popup_edit', args=[popup.pk]), {
+            'title': 'Sale', 'popup_type': 'banner', 'is_active': 'on', 'image': self.upload(),
+        })
+        self.assertEqual(self.released(), [old])
+
+
+@query_budget(1)
+def _two_query_view(request):
+    User.objects.count()
+    User.objects.count()
+    return HttpResponse()
+
+
+@override_settings(QUERY_BUDGET_HEADERS=True)
+class QueryBudgetTests(TestCase):
+    """The layer itself; PublicViewTests holds every public view to its budget."""
+
+    def get(self, view):
+        middleware = QueryBudgetMiddleware(view)
+        request = RequestFactory().get('/over-budget/')
+        middleware.process_view(request, view, (), {})
+        return middleware(request)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_strict_mode_fails_a_view_over_budget(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'sent 2 queries (budget 1, 1 duplicates)'):
+            self.get(_two_query_view)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_over_budget_is_logged_otherwise(self):
+        with self.assertLogs('shop.querybudget', 'WARNING'):
+            response = self.get(_two_query_view)
+        self.assertEqual(response['X-Query-Count'], '2')
+        self.assertEqual(response['X-Query-Duplicates'], '1')
+
+
+@override_settings(STATE_DIR=TEMP_DIR / 'state', JOBS_EAGER=False)
+class CacheVersionTests(TestCase):
+    def assertBumpedOnCommit(self, name, change):
+        before = get_version(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+            self.assertEqual(get_version(name), before)
+        self.assertGreater(get_version(name), before)
+
+    def test_site_chrome_version_moves_on_commit(self):
+        self.assertBumpedOnCommit(SITE_CHROME, lambda: MenuItem.objects.create(
+            location='header', label='Journal', url='/blog/',
+        ))
+
+    def test_home_page_version_moves_on_commit(self):
+        category = Category.objects.create(name='Dolls', slug='dolls')
+        self.assertBumpedOnCommit(HOME_PAGE, lambda: Product.objects.create(
+            name='Marionette', slug='marionette', category=category, price=10,
+        ))
+
+    def test_page_registry_version_moves_on_commit(self):
+        self.assertBumpedOnCommit(PAGES, lambda: Page.objects.create(title='About', slug='about'))
+
+
+@override_settings(MEDIA_ROOT=str(TEMP_DIR / 'media'), STATE_DIR=TEMP_DIR / 'state', JOBS_EAGER=False)
+class CatalogueImportTests(TestCase):
+    def test_reimport_without_slugs_creates_nothing(self):
+        records = [
+            parse_record({'name': name, 'category': 'Dolls', 'price': '12.50'})
+            for name in ('Porcelain Doll', '도자기 인형')
+        ]
+        for expected in ((2, 0), (0, 2)):
+            created, skipped = import_batch(records, ImageArchive(None), {})
+            self.assertEqual((len(created), skipped), expected)
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_long_names_fit_the_slug_field(self):
+        author = User.objects.create_user('importer')
+        names = ['Bisque ' * 17 + 'Doll', 'Bisque ' * 17 + 'Clown']
+        records = [parse_record({'name': name[:120], 'category': 'Dolls'}) for name in names]
+        for expected in ((2, 0), (0, 2)):
+            created, skipped = import_batch(records, ImageArchive(None), {}, author)
+            self.assertEqual((len(created), skipped), expected)
+        for model in (Product, Post):
+            slugs = list(model.objects.values_list('slug', flat=True))
+            self.assertEqual(len(set(slugs)), 2)
+            self.assertLessEqual(max(map(len, slugs)), model._meta.get_field('slug').max_length)
+
+
+# A media root of its own: gc_media would sweep the other tests' files.
+# The queued jobs run here, sitemaps.publish included, so STATIC_ROOT too
+@override_settings(
+    MEDIA_ROOT=str(TEMP_DIR / 'gc-media'),
+    STATIC_ROOT=str(TEMP_DIR / 'static'),
+    STATE_DIR=TEMP_DIR / 'state',
+    JOBS_EAGER=False,
+)
+class MediaReferenceTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Dolls', slug='dolls')
+
+    def product(self, slug):
+        buffer = io.BytesIO()
+        Image.new('RGB', (32, 32), 'navy').save(buffer, 'PNG')
+        product = Product(name=slug, slug=slug, category=self.category, price=10)
+        product.image.save('doll.png', ContentFile(buffer.getvalue()), save=False)
+        product.save()
+        return product
+
+    def test_gc_keeps_references_still_being_released(self):
+        a, b = self.product('a'), self.product('b')
+        self.assertEqual(a.image.name, b.image.name)
+        delete_products([a.pk])
+        call_command('gc_media', '--delete', '--grace', '0', stdout=io.StringIO())
+        while run_next():
+            pass
+        self.assertTrue(os.path.exists(b.image.path))
+        self.assertEqual(MediaBlob.objects.get(name=b.image.name).refcount, 1)
+
+    def test_cascaded_deletes_release_their_files(self):
+        product = self.product('a')
+        gallery = ProductImage.objects.create(product=product, image=product.image.name)
+        user = User.objects.create_user('maker', avatar=product.image.name)
+        self.category.delete()
+        user.delete()
+        released = [name for job in Job.objects.filter(task='files.delete') for name in job.payload['names']]
+        self.assertCountEqual(released, [product.image.name, gallery.image.name, user.avatar.name])
+
+
+@override_settings(MEDIA_ROOT=str(TEMP_DIR / 'renditions-media'), STATE_DIR=TEMP_DIR / 'state')
+class RenditionTests(TestCase):
+    def setUp(self):
+        renditions._manifests.clear()
+        renditions._misses.clear()
+        renditions._version = (None, 0)
+
+    def image(self, width):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, width // 2), 'plum').save(buffer, 'PNG')
+        name = default_storage.save(f'products/{width}.png', ContentFile(buffer.getvalue()))
+        return Product(image=name).image
+
+    def test_widths_stop_at_the_largest_preset(self):
+        manifest = renditions.generate_renditions(self.image(2000))
+        self.assertEqual(manifest['widths'], list(renditions.WIDTHS))
+
+    def test_manifest_without_formats_falls_back_to_the_original(self):
+        image = self.image(200)
+        default_storage.save(
+            f'{renditions.rendition_dir(image.name)}/manifest.json',
+            ContentFile(b'{"width": 200, "height": 100, "widths": [160, 200], "formats": []}'),
+        )
+        self.assertEqual(renditions.rendition_url(image, 320), image.url)
+
+    def test_missing_manifest_is_cached_until_renditions_are_written(self):
+        image = self.image(200)
+        with mock.patch.object(default_storage, 'open', wraps=default_storage.open) as opened:
+            self.assertIsNone(renditions.get_manifest(image))
+            self.assertIsNone(renditions.get_manifest(image))
+            self.assertEqual(opened.call_count, 1)
+        stale = dict(renditions._misses)
+        manifest = renditions.generate_renditions(image)
+        # As another worker sees it, once its version check comes round
+        renditions._manifests.clear()
+        renditions._misses.update(stale)
+        renditions._version = (None, 0)
+        self.assertEqual(renditions.get_manifest(image), manifest)
+
+
+class CommentCountTests(TestCase):
+    def test_deleting_posts_leaves_their_counts_alone(self):
+        author = User.objects.create_user('writer')
+        category = Category.objects.create(name='Dolls', slug='dolls')
+        product = Product.objects.create(name='Doll', slug='doll', category=category, price=10)
+        post = Post.objects.create(title='Doll', slug='doll', content='', author=author, related_product=product)
+        for _ in range(5):
+            Comment.objects.create(post=post, author=author, content='Lovely')
+        for delete in (lambda: delete_products([product.pk]), lambda: Post.objects.all().delete()):
+            with CaptureQueriesContext(connection) as queries:
+                delete()
+            counted = [q for q in queries if q['sql'].startswith('UPDATE "blog_post" SET "comment_count"')]
+            self.assertEqual(counted, [])
+
+
+@override_settings(
+    MEDIA_ROOT=str(TEMP_DIR / 'media'), STATE_DIR=TEMP_DIR / 'conditional-state', JOBS_EAGER=False,
+)
+class LastModifiedTests(TestCase):
+    """If-Modified-Since alone must see every change the ETag sees."""
+
+    def setUp(self):
+        category = Category.objects.create(name='Dolls', slug='dolls')
+        self.product = Product.objects.create(name='Doll', slug='doll', category=category, price=10)
+        Product.objects.filter(pk=self.product.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        self.url = reverse('product_detail', args=['doll'])
+        self.last_modified = self.client.get(self.url)['Last-Modified']
+
+    def revalidate(self):
+        return self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=self.last_modified).status_code
+
+    def test_unchanged_page_is_not_modified(self):
+        self.assertEqual(self.revalidate(), 304)
+
+    def test_site_chrome_change_modifies_the_page(self):
+        bump_version(SITE_CHROME)
+        self.assertEqual(self.revalidate(), 200)
+
+    def test_gallery_change_modifies_the_page(self):
+        ProductImage.objects.create(product=self.product, image='products/gallery/doll.png')
+        self.assertEqual(self.revalidate(), 200)
+
+
+@override_settings(STATE_DIR=TEMP_DIR / 'state', JOBS_EAGER=False)
+class WarmUpTests(TestCase):
+    def test_warm_up_stays_out_of_the_metrics(self):
+        def totals():
+            metrics._recorder.flush()
+            total, _ = metrics.collect()
+            return json.dumps(total, sort_keys=True)
+
+        before = totals()
+        results = warm_up([reverse('home'), reverse('product_list')])
+        self.assertEqual([status for _, status, _ in results], [200, 200])
+        self.assertEqual(totals(), before)
+
+
+@override_settings(JOBS_EAGER=False, JOBS_KEEP_DAYS=7)
+class JobPruningTests(TestCase):
+    def test_run_jobs_deletes_old_finished_jobs_only(self):
+        old_done, old_failed, recent_done = (
+            Job.objects.create(task='files.delete', status=status) for status in ('done', 'failed', 'done')
+        )
+        Job.objects.filter(pk__in=[old_done.pk, old_failed.pk]).update(
+            updated_at=timezone.now() - timedelta(days=8),
+        )
+        call_command('run_jobs', '--burst', stdout=io.StringIO())
+        self.assertQuerySetEqual(Job.objects.order_by('pk'), [old_failed, recent_done])
@@ -0,0 +1,96 @@
+"""Site stylesheet: the compiled Tailwind build and the theme colours.
+
+``manage.py build_css`` (also run by collectstatic) compiles the classes
+used in templates/ into one minified, content-hashed stylesheet under
+STATIC_GENERATED_DIR. Theme colours in that build are CSS variables
+whose values live in a small css/theme.css, rewritten whenever the
+SiteSetting is saved, so changing a colour never needs a rebuild.
+"""
+import json
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError
+
+STYLESHEET_MANIFEST = 'css/site.json'
+THEME_CSS = 'css/theme.css'
+
+# CSS variable name -> default, in the order SiteSetting lists them
+DEFAULT_COLORS = {
+    'parchment': '#FFF3CD',
+    'charcoal': '#2D2926',
+    'gold': '#D4AF37',
+    'velvet': '#8B0000',
+    'leather': '#8B4513',
+    'leather-light': '#A0522D',
+}
+
+HEX_COLOR_RE = re.compile(r'^#([0-9a-fA-F]{6})$')
+
+_stylesheet = (None, None)  # (manifest mtime, static path)
+
+
+def generated_path(name):
+    return Path(settings.STATIC_GENERATED_DIR) / name
+
+
+def write_atomic(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    tmp.write_text(content)
+    os.replace(tmp, path)
+
+
+def stylesheet_name():
+    """Static path of the compiled stylesheet, or None if it has not been built."""
+    global _stylesheet
+    try:
+        mtime = generated_path(STYLESHEET_MANIFEST).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached_mtime, name = _stylesheet
+    if cached_mtime != mtime:
+        with open(generated_path(STYLESHEET_MANIFEST)) as f:
+            name = json.load(f)['file']
+        _stylesheet = (mtime, name)
+    return name
+
+
+def stylesheet_version():
+    """mtime (ns) of the stylesheet manifest, which every build rewrites; 0 if not built."""
+    try:
+        return generated_path(STYLESHEET_MANIFEST).stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _rgb(value, default):
+    match = HEX_COLOR_RE.match(value or '') or HEX_COLOR_RE.match(default)
+    channels = match.group(1)
+    return ' '.join(str(int(channels[i:i + 2], 16)) for i in (0, 2, 4))
+
+
+def theme_css(site_settings=None):
+    """:root rule with the colour variables, as space-separated RGB channels."""
+    variables = ''.join(
+        f'--color-{name}:{_rgb(getattr(site_settings, "color_" + name.replace("-", "_"), None), default)};'
+        for name, default in DEFAULT_COLORS.items()
+    )
+    return f':root{{{variables}}}\n'
+
+
+def write_theme_css(site_settings=None):
+    """Regenerate css/theme.css, in the collected static root too if there is one."""
+    if site_settings is None:
+        from .models import SiteSetting
+        try:
+            site_settings = SiteSetting.objects.first()
+        except DatabaseError:
+            # e.g. collectstatic during an image build, before there is a database
+            site_settings = None
+    content = theme_css(site_settings)
+    write_atomic(generated_path(THEME_CSS), content)
+    if settings.STATIC_ROOT and Path(settings.STATIC_ROOT, 'css').is_dir():
+        write_atomic(Path(settings.STATIC_ROOT) / THEME_CSS, content)
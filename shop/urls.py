@@ -3,7 +3,9 @@ from . import views
 
 urlpatterns = [
     path('', views.product_list_view, name='product_list'),
+    path('list/more/', views.product_list_more_view, name='product_list_more'),
     path('manage/', views.manage_dashboard_view, name='manage_dashboard'),
+    path('manage/bulk/', views.manage_products_bulk_view, name='manage_products_bulk'),
     path('manage/create/', views.manage_create_view, name='manage_create'),
     path('manage/<int:pk>/edit/', views.manage_edit_view, name='manage_edit'),
     path('manage/<int:pk>/delete/', views.manage_delete_view, name='manage_delete'),
@@ -11,6 +13,7 @@ urlpatterns = [
     path('manage/category/<int:pk>/delete/', views.manage_category_delete_view, name='manage_category_delete'),
     path('manage/image/<int:pk>/delete/', views.manage_image_delete_view, name='manage_image_delete'),
     path('manage/content-image/<int:pk>/delete/', views.manage_content_image_delete_view, name='manage_content_image_delete'),
+    path('manage/<int:pk>/content-images/reorder/', views.manage_content_image_reorder_view, name='manage_content_image_reorder'),
     path('manage/banner/create/', views.manage_banner_create_view, name='manage_banner_create'),
     path('manage/banner/<int:pk>/edit/', views.manage_banner_edit_view, name='manage_banner_edit'),
     path('manage/banner/<int:pk>/delete/', views.manage_banner_delete_view, name='manage_banner_delete'),
@@ -26,5 +29,6 @@ urlpatterns = [
     path('manage/page/create/', views.manage_page_create_view, name='manage_page_create'),
     path('manage/page/<int:pk>/edit/', views.manage_page_edit_view, name='manage_page_edit'),
     path('manage/page/<int:pk>/delete/', views.manage_page_delete_view, name='manage_page_delete'),
+    path('manage/metrics/', views.manage_metrics_view, name='manage_metrics'),
     path('<slug:slug>/', views.product_detail_view, name='product_detail'),
 ]
@@ -1,31 +1,99 @@
+import hmac
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
+from django.http import Http404, HttpResponse, JsonResponse
+from django.core.cache import cache
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.utils.text import slugify
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.utils import timezone
 from django.db import models as db_models
-from PIL import Image as PILImage
-from io import BytesIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
-import sys
-
-from .models import Product, Category, ProductImage, ContentImage, HeroBanner, Popup, MenuItem, SiteSetting, Page
+from . import metrics
+from .bulk import (
+    PRODUCT_ACTIONS, BulkActionError, apply_product_action, delete_products, renumber_content_images,
+    reorder_content_images, reorder_menu,
+)
+from .cache import HOME_PAGE, SITE_CHROME, get_version
+from .conditional import aggregate_subquery, conditional_page, page_validators
+from .imaging import ImageTooLarge, ingest_image
+from .jobs import enqueue
+from .pages import get_page
+from .pagination import cursor_url, keyset_page
+from .parallel import gather_queries
+from .querybudget import query_budget
+from .related import related_products
+from .search import search
+from .models import (
+    Product, Category, ProductImage, ContentImage, HeroBanner, Popup, MenuItem, SiteSetting, Page, Job,
+    RelatedProduct,
+)
 from .forms import ProductPostForm, HeroBannerForm, PopupForm
 from blog.models import Post
 
 
-def home_view(request):
-    featured_products = Product.objects.filter(is_active=True, is_featured=True)[:4]
-    latest_products = Product.objects.filter(is_active=True)[:8]
-    latest_posts = Post.objects.all()[:3]
-    banners = HeroBanner.objects.filter(is_active=True)
-    now = timezone.now()
-    popups = Popup.objects.filter(is_active=True).filter(
+HOME_CACHE_TIMEOUT = 60 * 60
+
+
+def _popup_boundary(now):
+    """Next moment a scheduled popup starts or ends, or None."""
+    bounds = Popup.objects.filter(is_active=True).aggregate(
+        next_start=db_models.Min('start_date', filter=db_models.Q(start_date__gt=now)),
+        next_end=db_models.Min('end_date', filter=db_models.Q(end_date__gte=now)),
+    )
+    upcoming = [b for b in bounds.values() if b is not None]
+    return min(upcoming) if upcoming else None
+
+
+# Product cards only need the name, slug, image and category
+CARD_DEFERRED = ('description', 'description_html', 'description_hash')
+
+
+def _home_cache_key(request):
+    """The key of the cached home page, or None if this visitor gets their own."""
+    if request.user.is_authenticated or len(messages.get_messages(request)):
+        return None
+    return f'home:{get_version(HOME_PAGE)}:{get_version(SITE_CHROME)}'
+
+
+def _active_popups(now):
+    return list(Popup.objects.filter(is_active=True).filter(
         db_models.Q(start_date__isnull=True) | db_models.Q(start_date__lte=now)
     ).filter(
         db_models.Q(end_date__isnull=True) | db_models.Q(end_date__gte=now)
+    ))
+
+
+@query_budget(10)
+async def home_view(request):
+    # Anonymous visitors all see the same page, so it is cached per content
+    # version. Entries also carry the next popup boundary and are dropped
+    # once it passes, so scheduled popups still appear and vanish on time.
+    cache_key = await sync_to_async(_home_cache_key)(request)
+    if cache_key:
+        cached = await cache.aget(cache_key)
+        hit = bool(cached) and (cached['expires_at'] is None or timezone.now() < cached['expires_at'])
+        metrics.cache_lookup(request, 'home_page', hit)
+        if hit:
+            return HttpResponse(cached['content'])
+
+    # None of these depend on another: they run side by side
+    now = timezone.now()
+    cards = Product.objects.select_related('category').defer(*CARD_DEFERRED)
+    featured_products, latest_products, latest_posts, banners, popups, expires_at = await gather_queries(
+        request,
+        lambda: list(cards.filter(is_active=True, is_featured=True)[:4]),
+        lambda: list(cards.filter(is_active=True)[:8]),
+        lambda: list(Post.objects.defer('content_html')[:3]),
+        lambda: list(HeroBanner.objects.filter(is_active=True)),
+        lambda: _active_popups(now),
+        lambda: _popup_boundary(now) if cache_key else None,
     )
-    return render(request, 'home.html', {
+    response = await sync_to_async(render)(request, 'home.html', {
         'featured_products': featured_products,
         'latest_products': latest_products,
         'latest_posts': latest_posts,
@@ -33,43 +101,115 @@ def home_view(request):
         'popups': popups,
     })
 
+    if cache_key:
+        timeout = HOME_CACHE_TIMEOUT
+        if expires_at is not None:
+            timeout = max(1, min(timeout, int((expires_at - now).total_seconds()) + 1))
+        await cache.aset(cache_key, {'content': response.content, 'expires_at': expires_at}, timeout)
+    return response
 
-def product_list_view(request):
-    categories = Category.objects.all()
-    products = Product.objects.filter(is_active=True)
 
+def _product_list_page(request):
+    products = Product.objects.filter(is_active=True).select_related('category').defer(*CARD_DEFERRED)
     category_slug = request.GET.get('category')
     if category_slug:
         products = products.filter(category__slug=category_slug)
+    products, next_cursor = keyset_page(products, request.GET.get('cursor'))
+    return products, category_slug, next_cursor
 
+
+@query_budget(6)
+def product_list_view(request):
+    categories = Category.objects.all()
+    products, category_slug, next_cursor = _product_list_page(request)
     return render(request, 'shop/product_list.html', {
         'products': products,
         'categories': categories,
         'current_category': category_slug,
+        'next_url': next_cursor and cursor_url(request, reverse('product_list'), next_cursor),
+        'more_url': next_cursor and cursor_url(request, reverse('product_list_more'), next_cursor),
     })
 
 
-def product_detail_view(request, slug):
-    product = get_object_or_404(Product, slug=slug, is_active=True)
-    post = Post.objects.filter(related_product=product).first()
+@query_budget(3)
+def product_list_more_view(request):
+    """The next slice of product cards, for the shop page's "load more" button."""
+    products, _, next_cursor = _product_list_page(request)
+    response = render(request, 'shop/product_cards.html', {'products': products})
+    if next_cursor:
+        response['X-Next-Cursor'] = next_cursor
+    return response
+
+
+def _product_validators(request, slug):
+    gallery = ProductImage.objects.filter(product=db_models.OuterRef('pk'))
+    posts = Post.objects.filter(related_product=db_models.OuterRef('pk'))
+    related = RelatedProduct.objects.filter(product=db_models.OuterRef('pk'))
+    row = Product.objects.filter(slug=slug, is_active=True).annotate(
+        gallery_count=aggregate_subquery(gallery, 'product', db_models.Count('pk')),
+        gallery_last=aggregate_subquery(gallery, 'product', db_models.Max('pk')),
+        post_count=aggregate_subquery(posts, 'related_product', db_models.Count('pk')),
+        post_updated=aggregate_subquery(posts, 'related_product', db_models.Max('updated_at')),
+        related_computed=aggregate_subquery(related, 'product', db_models.Max('computed_at')),
+        related_updated=aggregate_subquery(related, 'product', db_models.Max('related__updated_at')),
+    ).values(
+        'pk', 'updated_at', 'description_hash', 'category__name', 'gallery_count', 'gallery_last',
+        'post_count', 'post_updated', 'related_computed', 'related_updated',
+    ).first()
+    if row is None:
+        return None
+    # description_hash covers content images, which are compiled into it
+    last_modified = max(filter(None, (row['updated_at'], row['post_updated'], row['related_updated'])))
+    return page_validators(request, 'product', *row.values(), last_modified=last_modified)
+
+
+def _related_cards(product):
+    related = related_products(product)
+    if not related:
+        # Not in the related-products index yet
+        related = list(Product.objects.filter(
+            category=product.category, is_active=True
+        ).exclude(id=product.id).defer(*CARD_DEFERRED)[:4])
+    return related
+
+
+@query_budget(8)
+@conditional_page(_product_validators)
+async def product_detail_view(request, slug):
+    product = await sync_to_async(get_object_or_404)(
+        Product.objects.select_related('category'), slug=slug, is_active=True,
+    )
+    post, gallery_images, related = await gather_queries(
+        request,
+        lambda: Post.objects.filter(related_product=product).first(),
+        lambda: list(product.images.all()),
+        lambda: _related_cards(product),
+    )
     # Don't show journal section if content is identical to product description
     if post and post.content.strip() == product.description.strip():
         post = None
-    content_images = product.content_images.all()
-    related_products = Product.objects.filter(
-        category=product.category, is_active=True
-    ).exclude(id=product.id)[:4]
-    return render(request, 'shop/product_detail.html', {
+    return await sync_to_async(render)(request, 'shop/product_detail.html', {
         'product': product,
+        'gallery_images': gallery_images,
         'post': post,
-        'content_images': content_images,
-        'related_products': related_products,
+        'related_products': related,
     })
 
 
 # ── Admin Management Views ──
 
 
+def _ingest_uploads(request, files):
+    """Uploads from a multi-file input, ready to store; oversized ones are reported and skipped."""
+    accepted = []
+    for f in files:
+        try:
+            accepted.append(ingest_image(f))
+        except ImageTooLarge as e:
+            messages.error(request, f'{f.name} was not uploaded: {e}')
+    return accepted
+
+
 def _unique_slug(base, model, field='slug', instance=None):
     slug = slugify(base)
     if not slug:
@@ -84,52 +224,69 @@ def _unique_slug(base, model, field='slug', instance=None):
     return candidate
 
 
-def _crop_image(image_file, crop_x, crop_y, crop_width, crop_height):
-    """Crop an uploaded image using coordinates from Cropper.js."""
-    img = PILImage.open(image_file)
-    if img.mode in ('RGBA', 'P'):
-        img = img.convert('RGB')
-
-    left = int(crop_x)
-    top = int(crop_y)
-    right = int(crop_x + crop_width)
-    bottom = int(crop_y + crop_height)
-
-    left = max(0, left)
-    top = max(0, top)
-    right = min(img.width, right)
-    bottom = min(img.height, bottom)
-
-    if crop_width > 0 and crop_height > 0:
-        img = img.crop((left, top, right, bottom))
-
-    buffer = BytesIO()
-    img.save(buffer, format='JPEG', quality=90)
-    buffer.seek(0)
-
-    name = image_file.name.rsplit('.', 1)[0] + '.jpg'
-    return InMemoryUploadedFile(
-        buffer, 'ImageField', name,
-        'image/jpeg', sys.getsizeof(buffer), None
-    )
-
-
 @staff_member_required
 def manage_dashboard_view(request):
-    products = Product.objects.select_related('category').order_by('-created_at')
-    categories = Category.objects.all()
+    products, next_cursor = keyset_page(
+        Product.objects.select_related('category').defer(*CARD_DEFERRED),
+        request.GET.get('cursor'), size=50,
+    )
+    categories = Category.objects.annotate(product_count=db_models.Count('products'))
     banners = HeroBanner.objects.all()
     popups = Popup.objects.all()
     pages = Page.objects.all()
+    job_counts = dict(
+        Job.objects.values_list('status').annotate(n=db_models.Count('pk')).order_by()
+    )
+    recent_jobs = Job.objects.exclude(status='done')[:10]
     return render(request, 'shop/manage_dashboard.html', {
         'products': products,
+        'next_url': next_cursor and cursor_url(request, reverse('manage_dashboard'), next_cursor),
+        'is_first_page': not request.GET.get('cursor'),
         'categories': categories,
         'banners': banners,
         'popups': popups,
         'pages': pages,
+        'job_counts': job_counts,
+        'recent_jobs': recent_jobs,
     })
 
 
+@staff_member_required
+def manage_products_bulk_view(request):
+    """One action on many products, in one transaction.
+
+    The dashboard posts a form (ids, action, category, price, percent) and
+    is redirected back; a JSON body with the same keys gets a JSON answer.
+    """
+    as_json = request.content_type == 'application/json'
+    if request.method != 'POST':
+        return JsonResponse({'ok': False}, status=405) if as_json else redirect('manage_dashboard')
+    if as_json:
+        try:
+            data = json.loads(request.body)
+            ids = data.get('ids', [])
+        except (json.JSONDecodeError, AttributeError):
+            return JsonResponse({'ok': False, 'error': 'Invalid JSON.'}, status=400)
+    else:
+        data, ids = request.POST, request.POST.getlist('ids')
+
+    action = data.get('action')
+    try:
+        count = apply_product_action(action, ids, data)
+    except BulkActionError as e:
+        if as_json:
+            return JsonResponse({'ok': False, 'error': str(e)}, status=400)
+        messages.error(request, str(e))
+    else:
+        if as_json:
+            return JsonResponse({'ok': True, 'count': count})
+        messages.success(request, f'{count} product(s) {PRODUCT_ACTIONS[action]}.')
+    next_url = request.POST.get('next', '')
+    if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('manage_dashboard')
+
+
 @staff_member_required
 def manage_category_add_view(request):
     if request.method == 'POST':
@@ -160,7 +317,8 @@ def manage_create_view(request):
     if request.method == 'POST':
         form = ProductPostForm(request.POST, request.FILES)
         if form.is_valid():
-            image = form.cleaned_data.get('image') or None
+            image = form.cleaned_data.get('image')
+            image = ingest_image(image) if image else None
 
             product = Product.objects.create(
                 name=form.cleaned_data['title'],
@@ -186,11 +344,11 @@ def manage_create_view(request):
                 image=image,
             )
 
-            for f in request.FILES.getlist('gallery'):
+            for f in _ingest_uploads(request, request.FILES.getlist('gallery')):
                 ProductImage.objects.create(product=product, image=f)
 
             existing_count = 0
-            for f in request.FILES.getlist('content_images'):
+            for f in _ingest_uploads(request, request.FILES.getlist('content_images')):
                 existing_count += 1
                 ContentImage.objects.create(
                     product=product, image=f, number=existing_count
@@ -214,13 +372,16 @@ def manage_edit_view(request, pk):
     if request.method == 'POST':
         form = ProductPostForm(request.POST, request.FILES)
         if form.is_valid():
-            image = form.cleaned_data.get('image') or None
+            image = form.cleaned_data.get('image')
+            image = ingest_image(image) if image else None
 
             product.name = form.cleaned_data['title']
             product.slug = _unique_slug(form.cleaned_data['title'], Product, instance=product)
             product.category = form.cleaned_data['category']
             product.description = form.cleaned_data['content']
             product.is_featured = form.cleaned_data['is_featured']
+            # Each image saved adds a reference: the ones replaced drop theirs
+            replaced = [product.image.name]
             if image:
                 product.image = image
             product.save()
@@ -229,16 +390,21 @@ def manage_edit_view(request, pk):
                 post.title = form.cleaned_data['title']
                 post.slug = _unique_slug(form.cleaned_data['title'], Post, instance=post)
                 post.content = form.cleaned_data['content']
+                replaced.append(post.image.name)
                 if image:
                     image.seek(0)
                     post.image = image
                 post.save()
 
-            for f in request.FILES.getlist('gallery'):
+            replaced = [name for name in replaced if name]
+            if image and replaced:
+                enqueue('files.delete', names=replaced)
+
+            for f in _ingest_uploads(request, request.FILES.getlist('gallery')):
                 ProductImage.objects.create(product=product, image=f)
 
             existing_count = product.content_images.count()
-            for f in request.FILES.getlist('content_images'):
+            for f in _ingest_uploads(request, request.FILES.getlist('content_images')):
                 existing_count += 1
                 ContentImage.objects.create(
                     product=product, image=f, number=existing_count
@@ -263,8 +429,7 @@ def manage_edit_view(request, pk):
 @staff_member_required
 def manage_image_delete_view(request, pk):
     img = get_object_or_404(ProductImage, pk=pk)
-    product_pk = img.product.pk
-    img.image.delete()
+    product_pk = img.product_id
     img.delete()
     messages.success(request, 'Image deleted.')
     return redirect('manage_edit', pk=product_pk)
@@ -273,25 +438,31 @@ def manage_image_delete_view(request, pk):
 @staff_member_required
 def manage_content_image_delete_view(request, pk):
     img = get_object_or_404(ContentImage, pk=pk)
-    product_pk = img.product.pk
-    img.image.delete()
+    product_pk = img.product_id
     img.delete()
-    # Renumber remaining content images
-    for i, ci in enumerate(ContentImage.objects.filter(product_id=product_pk), 1):
-        if ci.number != i:
-            ci.number = i
-            ci.save()
+    renumber_content_images(img.product)
     messages.success(request, 'Content image deleted. Numbers updated.')
     return redirect('manage_edit', pk=product_pk)
 
 
+@staff_member_required
+def manage_content_image_reorder_view(request, pk):
+    product = get_object_or_404(Product, pk=pk)
+    if request.method != 'POST':
+        return JsonResponse({'ok': False}, status=405)
+    try:
+        reorder_content_images(product, json.loads(request.body).get('order', []))
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        return JsonResponse({'ok': False}, status=400)
+    return JsonResponse({'ok': True})
+
+
 @staff_member_required
 def manage_delete_view(request, pk):
     product = get_object_or_404(Product, pk=pk)
     if request.method == 'POST':
-        Post.objects.filter(related_product=product).delete()
+        delete_products([product.pk])
         name = product.name
-        product.delete()
         messages.success(request, f'"{name}" has been deleted.')
         return redirect('manage_dashboard')
     return render(request, 'shop/product_confirm_delete.html', {
@@ -312,18 +483,17 @@ def manage_banner_create_view(request):
             crop_y = form.cleaned_data['crop_y']
             crop_w = form.cleaned_data['crop_width']
             crop_h = form.cleaned_data['crop_height']
-
-            if crop_w > 0 and crop_h > 0:
-                cropped = _crop_image(image, crop_x, crop_y, crop_w, crop_h)
-            else:
-                cropped = image
+            # A pending crop is re-encoded by the job; its coordinates are
+            # for the upload as it is
+            if not (crop_w > 0 and crop_h > 0):
+                image = ingest_image(image)
 
             text_overlays = request.POST.get('text_overlays', '[]')
 
-            HeroBanner.objects.create(
+            banner = HeroBanner.objects.create(
                 title=form.cleaned_data.get('title', ''),
                 subtitle=form.cleaned_data.get('subtitle', ''),
-                image=cropped,
+                image=image,
                 crop_x=crop_x, crop_y=crop_y,
                 crop_width=crop_w, crop_height=crop_h,
                 text_overlays=text_overlays,
@@ -331,6 +501,9 @@ def manage_banner_create_view(request):
                 display_order=form.cleaned_data['display_order'],
                 link_url=form.cleaned_data.get('link_url', ''),
             )
+            # Cropping re-encodes the full upload, so it runs in the job worker
+            if crop_w > 0 and crop_h > 0:
+                enqueue('images.crop_banner', banner_id=banner.pk, image_name=banner.image.name)
             messages.success(request, 'Hero banner created.')
             return redirect('manage_dashboard')
     else:
@@ -353,22 +526,20 @@ def manage_banner_edit_view(request, pk):
             banner.text_overlays = request.POST.get('text_overlays', '[]')
 
             image = form.cleaned_data.get('image')
+            old_image_name = banner.image.name
             if image:
-                crop_x = form.cleaned_data['crop_x']
-                crop_y = form.cleaned_data['crop_y']
-                crop_w = form.cleaned_data['crop_width']
-                crop_h = form.cleaned_data['crop_height']
-                if crop_w > 0 and crop_h > 0:
-                    cropped = _crop_image(image, crop_x, crop_y, crop_w, crop_h)
-                else:
-                    cropped = image
-                banner.image = cropped
-                banner.crop_x = crop_x
-                banner.crop_y = crop_y
-                banner.crop_width = crop_w
-                banner.crop_height = crop_h
+                banner.crop_x = form.cleaned_data['crop_x']
+                banner.crop_y = form.cleaned_data['crop_y']
+                banner.crop_width = form.cleaned_data['crop_width']
+                banner.crop_height = form.cleaned_data['crop_height']
+                cropping = banner.crop_width > 0 and banner.crop_height > 0
+                banner.image = image if cropping else ingest_image(image)
 
             banner.save()
+            if image and old_image_name:
+                enqueue('files.delete', names=[old_image_name])
+                if banner.crop_width > 0 and banner.crop_height > 0:
+                    enqueue('images.crop_banner', banner_id=banner.pk, image_name=banner.image.name)
             messages.success(request, 'Banner updated.')
             return redirect('manage_dashboard')
     else:
@@ -392,7 +563,6 @@ def manage_banner_edit_view(request, pk):
 def manage_banner_delete_view(request, pk):
     banner = get_object_or_404(HeroBanner, pk=pk)
     if request.method == 'POST':
-        banner.image.delete()
         banner.delete()
         messages.success(request, 'Banner deleted.')
     return redirect('manage_dashboard')
@@ -406,11 +576,12 @@ def manage_popup_create_view(request):
     if request.method == 'POST':
         form = PopupForm(request.POST, request.FILES)
         if form.is_valid():
+            image = form.cleaned_data.get('image')
             Popup.objects.create(
                 title=form.cleaned_data['title'],
                 popup_type=form.cleaned_data['popup_type'],
                 content=form.cleaned_data.get('content', ''),
-                image=form.cleaned_data.get('image') or None,
+                image=ingest_image(image) if image else None,
                 link_url=form.cleaned_data.get('link_url', ''),
                 is_active=form.cleaned_data['is_active'],
                 start_date=form.cleaned_data.get('start_date'),
@@ -438,9 +609,12 @@ def manage_popup_edit_view(request, pk):
             popup.start_date = form.cleaned_data.get('start_date')
             popup.end_date = form.cleaned_data.get('end_date')
             image = form.cleaned_data.get('image')
+            old_image_name = popup.image.name
             if image:
-                popup.image = image
+                popup.image = ingest_image(image)
             popup.save()
+            if image and old_image_name:
+                enqueue('files.delete', names=[old_image_name])
             messages.success(request, 'Popup updated.')
             return redirect('manage_dashboard')
     else:
@@ -462,8 +636,6 @@ def manage_popup_edit_view(request, pk):
 def manage_popup_delete_view(request, pk):
     popup = get_object_or_404(Popup, pk=pk)
     if request.method == 'POST':
-        if popup.image:
-            popup.image.delete()
         popup.delete()
         messages.success(request, 'Popup deleted.')
     return redirect('manage_dashboard')
@@ -519,7 +691,7 @@ def manage_site_settings_view(request):
     return redirect('manage_menu')
 
 
-KNOWN_PREFIXES = {'/', '/shop/', '/blog/', '/admin/', '/accounts/'}
+KNOWN_PREFIXES = {'/', '/shop/', '/blog/', '/admin/', '/accounts/', '/search/'}
 
 
 def _auto_create_page_if_needed(url, label):
@@ -622,16 +794,11 @@ def manage_menu_delete_view(request, pk):
 
 @staff_member_required
 def manage_menu_reorder_view(request):
-    import json
-    from django.http import JsonResponse
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            order = data.get('order', [])
-            for idx, pk in enumerate(order):
-                MenuItem.objects.filter(pk=pk).update(display_order=idx)
+            reorder_menu(json.loads(request.body).get('order', []))
             return JsonResponse({'ok': True})
-        except (json.JSONDecodeError, TypeError):
+        except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
             return JsonResponse({'ok': False}, status=400)
     return JsonResponse({'ok': False}, status=405)
 
@@ -639,11 +806,30 @@ def manage_menu_reorder_view(request):
 # ── Page Views ──
 
 
+def _page_validators(request, slug):
+    page = get_page(slug)
+    if page is None:
+        return None
+    return page_validators(request, 'page', page.pk, page.updated_at, last_modified=page.updated_at)
+
+
+@query_budget(5)
+@conditional_page(_page_validators)
 def page_detail_view(request, slug):
-    page = get_object_or_404(Page, slug=slug, is_active=True)
+    # Served from the per-worker registry: no query, even for a 404
+    page = get_page(slug)
+    if page is None:
+        raise Http404('No page at this address.')
     return render(request, 'page_detail.html', {'page': page})
 
 
+@query_budget(3)
+def search_view(request):
+    query = request.GET.get('q', '').strip()[:200]
+    results = search(query) if query else []
+    return render(request, 'search.html', {'query': query, 'results': results})
+
+
 @staff_member_required
 def manage_page_create_view(request):
     if request.method == 'POST':
@@ -703,3 +889,21 @@ def manage_page_delete_view(request, pk):
         page.delete()
         messages.success(request, f'Page "{title}" deleted.')
     return redirect('manage_dashboard')
+
+
+# ── Metrics ──
+
+
+@staff_member_required
+def _staff_metrics(request):
+    return HttpResponse(metrics.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def manage_metrics_view(request):
+    """Prometheus metrics of every worker, for staff or a scraper sending METRICS_TOKEN."""
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode(),
+    ):
+        return HttpResponse(metrics.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    return _staff_metrics(request)
@@ -0,0 +1,59 @@
+"""Render the busiest pages once in a fresh worker, before it takes traffic.
+
+A new worker otherwise pays on its first real requests for what only
+happens once per process: compiling templates, resolving URLs, opening
+database connections, loading the site chrome and filling the home page
+cache. gunicorn.conf.py calls warm_up() from post_worker_init.
+"""
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import close_old_connections
+from django.test import RequestFactory
+from django.urls import reverse
+
+from .metrics import UNRECORDED
+
+MAX_MENU_PAGES = 10
+
+
+def warm_up_paths():
+    """The home, shop and journal pages, then the site pages of the header menu."""
+    from .models import MenuItem
+
+    paths = [reverse('home'), reverse('product_list'), reverse('post_list')]
+    for url in MenuItem.objects.filter(location='header', is_active=True).values_list('url', flat=True):
+        # Only this site's pages, as written in the menu editor
+        if url.startswith('/') and not url.startswith('//') and url not in paths:
+            paths.append(url)
+        if len(paths) >= 3 + MAX_MENU_PAGES:
+            break
+    return paths
+
+
+def _host():
+    for host in settings.ALLOWED_HOSTS:
+        if host and not host.startswith(('.', '*')):
+            return host
+    return 'localhost'
+
+
+def warm_up(paths=None):
+    """GET each path through the full middleware stack; [(path, status, ms)]."""
+    handler = WSGIHandler()
+    factory = RequestFactory(SERVER_NAME=_host())
+    results = []
+    try:
+        for path in paths or warm_up_paths():
+            started = time.perf_counter()
+            try:
+                # Not real traffic: kept out of the request metrics
+                request = factory.get(path, secure=True, **{UNRECORDED: True})
+                status = handler.get_response(request).status_code
+            except Exception as e:
+                status = type(e).__name__
+            results.append((path, status, round((time.perf_counter() - started) * 1000, 1)))
+    finally:
+        close_old_connections()
+    return results
@@ -0,0 +1,29 @@
+// Build with `python manage.py build_css` (also run by collectstatic).
+// Theme colours are CSS variables so SiteSetting changes need no rebuild;
+// their values are written to css/theme.css by shop/theme.py.
+const color = (name) => `rgb(var(--color-${name}) / <alpha-value>)`;
+
+module.exports = {
+    content: [
+        './templates/**/*.html',
+        './shop/content.py',
+    ],
+    theme: {
+        extend: {
+            colors: {
+                parchment: color('parchment'),
+                charcoal: color('charcoal'),
+                gold: color('gold'),
+                velvet: color('velvet'),
+                brass: '#B5A642',
+                leather: color('leather'),
+                'leather-light': color('leather-light'),
+            },
+            fontFamily: {
+                heading: ['Cinzel', 'Noto Serif KR', 'serif'],
+                display: ['Playfair Display', 'Noto Serif KR', 'serif'],
+                body: ['Inter', 'Noto Sans KR', 'sans-serif'],
+            },
+        },
+    },
+};